@@ -0,0 +1,49 @@
+from PyQt5.QtCore import QObject, QTimer, QElapsedTimer
+
+
+class AnimationScheduler(QObject):
+    '''
+    Runs a per-frame callback only while something is animating. The callback
+    gets the milliseconds since the previous frame and returns True to keep
+    ticking; once it returns False the timer stops until wake() is called.
+    '''
+
+    def __init__(self, callback, fps=60, parent=None):
+        super().__init__(parent)
+        self.callback = callback
+
+        self.elapsedTimer = QElapsedTimer()
+        self.elapsedTimer.start()
+        self.lastTime = self.elapsedTimer.elapsed()
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self._tick)
+        self.setFrameRate(fps)
+
+    def now(self):
+        return self.elapsedTimer.elapsed()
+
+    def setFrameRate(self, fps):
+        self.fps = fps
+        self.timer.setInterval(max(1, round(1000 / fps)))
+
+    def isActive(self):
+        return self.timer.isActive()
+
+    def wake(self):
+        if self.timer.isActive():
+            return
+        # don't count the idle time as one giant frame
+        self.lastTime = self.now()
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    def _tick(self):
+        now = self.now()
+        dtMs = now - self.lastTime
+        self.lastTime = now
+
+        if not self.callback(dtMs):
+            self.timer.stop()
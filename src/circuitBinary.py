@@ -0,0 +1,342 @@
+'''
+Compact binary circuit files that can be opened without reading them whole.
+
+A file is a small header followed by length-prefixed sections:
+
+    header   b"CKTB", version (u16), section count (u16)
+    section  tag (4 bytes), payload length (u64), payload
+
+    STRS  every id, symbol and value once: count (u32), count + 1 end
+          offsets (u32) into the utf-8 blob that follows
+    CHNK  chunk size (u32), count (u32), then one chunkDtype record per
+          spatial chunk: its grid cell, the bounds of everything in it and
+          the range of ITEM and WIRE records that belong to it
+    ITEM  itemDtype records grouped by chunk
+    WIRE  wireDtype records grouped by chunk
+
+Components belong to the chunk their position falls in and wires to the
+chunk their start falls in. Records are fixed size, so the reader maps the
+file and views the sections as arrays without copying; only the chunks
+that are asked for get turned into model objects.
+
+Coordinates are limited to +-coordinateLimit. Wires have to be horizontal
+or vertical, the same as in the editor.
+'''
+import mmap
+import struct
+
+import numpy as np
+
+from model import Wire, componentTypes
+from scene import Scene
+
+magic = b"CKTB"
+version = 1
+# far past anything drawn by hand, and it keeps a corrupt coordinate from
+# turning into a wire millions of grid cells long
+coordinateLimit = 1 << 20
+
+_header = struct.Struct("<4sHH")
+_sectionHeader = struct.Struct("<4sQ")
+_noString = 0xFFFFFFFF
+_directions = ["west", "north", "east", "south"]
+
+chunkDtype = np.dtype([
+    ("cx", "<i4"), ("cy", "<i4"),
+    ("left", "<i4"), ("top", "<i4"), ("right", "<i4"), ("bottom", "<i4"),
+    ("firstItem", "<u4"), ("itemCount", "<u4"), ("firstWire", "<u4"), ("wireCount", "<u4"),
+])
+itemDtype = np.dtype([("id", "<u4"), ("symbol", "<u4"), ("value", "<u4"), ("x", "<i4"), ("y", "<i4"), ("r", "u1")])
+wireDtype = np.dtype([("id", "<u4"), ("x0", "<i4"), ("y0", "<i4"), ("x1", "<i4"), ("y1", "<i4")])
+
+
+def checkGeometry(positions, wireEnds):
+    '''
+    Raises ValueError if a component position or wire end is further out than
+    coordinateLimit, or a wire isn't horizontal or vertical. positions is
+    array-like of (x, y) rows and wireEnds of (x0, y0, x1, y1) rows. Both file
+    formats go through this before anything is added to a scene.
+    '''
+    try:
+        positions = np.asarray(positions, dtype=np.int64).reshape(-1, 2)
+        wireEnds = np.asarray(wireEnds, dtype=np.int64).reshape(-1, 4)
+    except OverflowError:
+        raise ValueError(f"coordinate out of range, the limit is +-{coordinateLimit}") from None
+    if np.any(np.abs(positions) > coordinateLimit) or np.any(np.abs(wireEnds) > coordinateLimit):
+        raise ValueError(f"coordinate out of range, the limit is +-{coordinateLimit}")
+    if np.any((wireEnds[:, 0] != wireEnds[:, 2]) & (wireEnds[:, 1] != wireEnds[:, 3])):
+        raise ValueError("diagonal wire")
+
+
+class _StringTable():
+    def __init__(self):
+        self.index = {}
+        self.strings = []
+
+    def add(self, text):
+        i = self.index.get(text)
+        if i is None:
+            i = self.index[text] = len(self.strings)
+            self.strings.append(text)
+        return i
+
+    def toBytes(self):
+        encoded = [text.encode("utf-8") for text in self.strings]
+        ends = np.cumsum([0] + [len(blob) for blob in encoded], dtype="<u4")
+        return struct.pack("<I", len(encoded)) + ends.tobytes() + b"".join(encoded)
+
+
+def saveBinary(scene, path, chunkSize=1024):
+    '''
+    Raises ValueError if something is further out than coordinateLimit.
+    '''
+    strings = _StringTable()
+
+    items = list(scene.items.values())
+    coords = scene.wireStore.coords[:len(scene.wireStore)]
+    if any(abs(v) > coordinateLimit for item in items for v in item.pos) or np.any(np.abs(coords) > coordinateLimit):
+        raise ValueError(f"Circuit reaches further out than {coordinateLimit}, it can't be saved as .circ")
+    itemChunks = [(item.pos[0] // chunkSize, item.pos[1] // chunkSize) for item in items]
+
+    store = scene.wireStore
+    n = len(store)
+    wireCoords = store.coords[:n]
+    # oldest first within each chunk, same as the order they were added in
+    wireOrder = np.argsort(store.seq[:n], kind="stable")
+    wireCoords = wireCoords[wireOrder]
+    wireIds = [store.ids[row] for row in wireOrder]
+    wireChunks = wireCoords[:, :2] // chunkSize
+
+    byChunk = {}
+    for i, key in enumerate(itemChunks):
+        byChunk.setdefault(key, ([], []))[0].append(i)
+    for i, key in enumerate(map(tuple, wireChunks.tolist())):
+        byChunk.setdefault(key, ([], []))[1].append(i)
+
+    keys = sorted(byChunk)
+    chunks = np.zeros(len(keys), dtype=chunkDtype)
+    itemRecords = np.zeros(len(items), dtype=itemDtype)
+    wireRecords = np.zeros(n, dtype=wireDtype)
+    nextItem = nextWire = 0
+    margin = store.paintMargin
+    for c, key in enumerate(keys):
+        itemRows, wireRows = byChunk[key]
+        bounds = None
+        for i in itemRows:
+            item = items[i]
+            value = item.getPrimaryField() if item.primaryField != "" else None
+            itemRecords[nextItem] = (strings.add(item.id), strings.add(item.symbol),
+                                     _noString if value is None else strings.add(value),
+                                     item.pos[0], item.pos[1], _directions.index(item.r))
+            nextItem += 1
+            rect = item.paintRect()
+            bounds = rect if bounds is None else (min(bounds[0], rect[0]), min(bounds[1], rect[1]),
+                                                  max(bounds[2], rect[2]), max(bounds[3], rect[3]))
+        if wireRows:
+            coords = wireCoords[wireRows]
+            xs, ys = coords[:, 0::2], coords[:, 1::2]
+            rect = (int(xs.min()) - margin, int(ys.min()) - margin, int(xs.max()) + margin, int(ys.max()) + margin)
+            bounds = rect if bounds is None else (min(bounds[0], rect[0]), min(bounds[1], rect[1]),
+                                                  max(bounds[2], rect[2]), max(bounds[3], rect[3]))
+            records = wireRecords[nextWire:nextWire + len(wireRows)]
+            records["id"] = [strings.add(wireIds[i]) for i in wireRows]
+            for column, name in enumerate(["x0", "y0", "x1", "y1"]):
+                records[name] = coords[:, column]
+            nextWire += len(wireRows)
+        chunks[c] = (key[0], key[1], *bounds, nextItem - len(itemRows), len(itemRows), nextWire - len(wireRows), len(wireRows))
+
+    sections = [
+        (b"STRS", strings.toBytes()),
+        (b"CHNK", struct.pack("<II", chunkSize, len(chunks)) + chunks.tobytes()),
+        (b"ITEM", itemRecords.tobytes()),
+        (b"WIRE", wireRecords.tobytes()),
+    ]
+    with open(path, "wb") as f:
+        f.write(_header.pack(magic, version, len(sections)))
+        for tag, payload in sections:
+            f.write(_sectionHeader.pack(tag, len(payload)))
+            f.write(payload)
+
+
+class CircuitReader():
+    '''
+    A memory-mapped binary circuit file. Opening one only reads the section
+    headers, chunks are decoded into components and wires as they're asked for.
+    Raises ValueError if the file isn't one.
+    '''
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # mmap refuses empty files
+            self._file.close()
+            raise ValueError("Not a circuit file: it's empty")
+        self._strings = {}
+        try:
+            self._readSections()
+        except KeyError as e:
+            self.close()
+            raise ValueError(f"Not a circuit file: missing section {e}")
+        except (ValueError, struct.error) as e:
+            self.close()
+            raise ValueError(f"Not a circuit file: {e}")
+
+    def _readSections(self):
+        # everything is read straight from the map by offset, so the only
+        # views into it are the arrays kept on self
+        data = self._map
+        fileMagic, fileVersion, count = _header.unpack_from(data, 0)
+        if fileMagic != magic:
+            raise ValueError("bad magic")
+        if fileVersion != version:
+            raise ValueError(f"unsupported version {fileVersion}")
+
+        sections = {}
+        offset = _header.size
+        for _ in range(count):
+            tag, length = _sectionHeader.unpack_from(data, offset)
+            offset += _sectionHeader.size
+            if offset + length > len(data):
+                raise ValueError(f"section {tag!r} runs past the end of the file")
+            sections[tag] = (offset, length)
+            offset += length
+
+        start, _ = sections[b"STRS"]
+        (stringCount,) = struct.unpack_from("<I", data, start)
+        self._stringEnds = np.frombuffer(data, dtype="<u4", count=stringCount + 1, offset=start + 4)
+        self._stringStart = start + 4 * (stringCount + 2)
+
+        start, _ = sections[b"CHNK"]
+        self.chunkSize, chunkCount = struct.unpack_from("<II", data, start)
+        self.chunks = np.frombuffer(data, dtype=chunkDtype, count=chunkCount, offset=start + 8)
+        start, length = sections[b"ITEM"]
+        self.itemRecords = np.frombuffer(data, dtype=itemDtype, count=length // itemDtype.itemsize, offset=start)
+        start, length = sections[b"WIRE"]
+        self.wireRecords = np.frombuffer(data, dtype=wireDtype, count=length // wireDtype.itemsize, offset=start)
+        self._validate(sections[b"STRS"])
+
+    def _validate(self, strings):
+        # checked once up front, so decoding a chunk later can't run off the end of anything
+        start, length = strings
+        ends = self._stringEnds
+        if np.any(np.diff(ends.astype(np.int64)) < 0) or self._stringStart + int(ends[-1]) > start + length:
+            raise ValueError("string table is corrupt")
+
+        count = len(ends) - 1
+        items, wires = self.itemRecords, self.wireRecords
+        if np.any(items["id"] >= count) or np.any(items["symbol"] >= count) or np.any(wires["id"] >= count):
+            raise ValueError("string index out of range")
+        if np.any((items["value"] >= count) & (items["value"] != _noString)):
+            raise ValueError("string index out of range")
+        if np.any(items["r"] >= len(_directions)):
+            raise ValueError("bad rotation")
+        checkGeometry(np.stack([items["x"], items["y"]], axis=1),
+                      np.stack([wires[name] for name in ["x0", "y0", "x1", "y1"]], axis=1))
+        for symbol in np.unique(items["symbol"]).tolist():
+            if self.string(symbol) not in componentTypes:
+                raise ValueError(f"unknown component type {self.string(symbol)!r}")
+
+        c = self.chunks
+        if (np.any(c["firstItem"].astype(np.int64) + c["itemCount"] > len(items))
+                or np.any(c["firstWire"].astype(np.int64) + c["wireCount"] > len(wires))):
+            raise ValueError("chunk runs past its records")
+
+    def close(self):
+        # the arrays are views into the map, they have to go first
+        self._stringEnds = self.chunks = self.itemRecords = self.wireRecords = None
+        if not self._map.closed:
+            try:
+                self._map.close()
+            except BufferError:
+                # someone still holds a view, the map goes away with it
+                pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def string(self, i):
+        text = self._strings.get(i)
+        if text is None:
+            start, end = int(self._stringEnds[i]), int(self._stringEnds[i + 1])
+            text = self._strings[i] = self._map[self._stringStart + start:self._stringStart + end].decode("utf-8")
+        return text
+
+    def ids(self):
+        '''
+        Returns the id of every component and wire in the file.
+        '''
+        indices = np.concatenate([self.itemRecords["id"], self.wireRecords["id"]]).tolist()
+        ends = self._stringEnds.tolist()
+        blob = self._map[self._stringStart:self._stringStart + ends[-1]]
+        if not blob.isascii():
+            return [self.string(i) for i in indices]
+        # byte offsets are character offsets, so one decode covers every id
+        text = blob.decode("ascii")
+        return [text[ends[i]:ends[i + 1]] for i in indices]
+
+    def positions(self):
+        '''
+        Returns the position of every component in the file.
+        '''
+        return list(zip(self.itemRecords["x"].tolist(), self.itemRecords["y"].tolist()))
+
+    def chunksIn(self, rect):
+        '''
+        Returns the chunks whose contents overlap rect, as an array of chunk numbers.
+        '''
+        c = self.chunks
+        return np.flatnonzero((c["left"] <= rect[2]) & (c["right"] >= rect[0]) & (c["top"] <= rect[3]) & (c["bottom"] >= rect[1]))
+
+    def chunkBounds(self, chunk):
+        c = self.chunks[chunk]
+        return (int(c["left"]), int(c["top"]), int(c["right"]), int(c["bottom"]))
+
+    def readChunk(self, chunk):
+        '''
+        Decodes one chunk into (components, wires).
+        '''
+        c = self.chunks[chunk]
+        first, count = int(c["firstItem"]), int(c["itemCount"])
+        items = []
+        for id, symbol, value, x, y, r in self.itemRecords[first:first + count].tolist():
+            item = componentTypes[self.string(symbol)](self.string(id), (x, y), _directions[r])
+            if value != _noString:
+                item.setPrimaryField(self.string(value))
+            items.append(item)
+
+        first, count = int(c["firstWire"]), int(c["wireCount"])
+        wires = [Wire(self.string(id), (x0, y0), (x1, y1))
+                 for id, x0, y0, x1, y1 in self.wireRecords[first:first + count].tolist()]
+        return items, wires
+
+
+def loadChunk(scene, reader, chunk):
+    '''
+    Adds one chunk of the file to the scene and returns the area it covers.
+    '''
+    items, wires = reader.readChunk(chunk)
+    for item in items:
+        scene.addItem(item)
+    for wire in wires:
+        scene.addWire(wire)
+    return reader.chunkBounds(chunk)
+
+
+def loadBinary(path):
+    '''
+    Reads a whole binary circuit file into a new scene.
+    '''
+    scene = Scene()
+    with CircuitReader(path) as reader:
+        for chunk in range(len(reader)):
+            loadChunk(scene, reader, chunk)
+    return scene
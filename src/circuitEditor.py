@@ -1,23 +1,114 @@
 import copy
+import math
+import time
 
-from PyQt5.QtWidgets import QWidget, QInputDialog
-from PyQt5.QtGui import QMouseEvent, QPaintEvent, QPixmap, QPainter, QShowEvent
-from PyQt5.QtCore import Qt, QPoint, QTimer, QElapsedTimer, QPointF
+import numpy as np
 
-from drawable import Resistor, Capacitor, VoltageSource, Wire, Ground, nextDirection
+from PyQt5.QtWidgets import QWidget, QInputDialog, QFileDialog, QMessageBox
+from PyQt5.QtGui import QMouseEvent, QPaintEvent, QPixmap, QPainter, QShowEvent
+from PyQt5.QtCore import Qt, QPoint, QPointF, QRect, QTimer
+
+from model import Resistor, Capacitor, VoltageSource, Wire, Ground, nextDirection, unionBounds
+from drawable import drawDrawable, drawItemOutline, drawWire, drawWires, drawWireCursor
+from scene import Scene
+from animation import AnimationScheduler
+from tileCache import TileCache
+from solveWorker import SolveWorker
+from mna import extractCircuit, SweepResult
+from circuitFile import saveCircuit, loadJson
+from circuitBinary import CircuitReader, loadChunk
+from journal import lockedJournal
+from history import History, AddObjects, RemoveObjects, SetField
+from profiler import Profiler, timed
+from router import RouteSearch, grid
+from values import parseValue
+
+def _asTuple(point):
+    # the model works in plain (x, y) grid points, Qt hands us QPoint/QPointF
+    if isinstance(point, QPointF):
+        point = point.toPoint()
+    return (point.x(), point.y())
+
+class _SceneEdits():
+    '''
+    Scene changes made on the user's behalf, which also get journaled and
+    repainted. Undo/redo commands apply themselves through this.
+    '''
+
+    def __init__(self, editor):
+        self.editor = editor
+
+    def addItem(self, item):
+        editor = self.editor
+        editor.scene.addItem(item)
+        if editor.journal is not None:
+            editor.journal.place(item)
+        editor._invalidate(item)
+        editor._solveAgain()
+
+    def addWire(self, wire):
+        editor = self.editor
+        editor.scene.addWire(wire)
+        if editor.journal is not None:
+            editor.journal.wire(wire)
+        editor._invalidate(wire)
+        editor._solveAgain()
+
+    def remove(self, id):
+        editor = self.editor
+        removed = editor.scene.remove(id)
+        if removed is None:
+            return None
+        if editor.journal is not None:
+            editor.journal.remove(id)
+        if removed is editor.hovered:
+            editor.hovered = None
+            editor.hoveredItemId = None
+        if removed is editor.selected:
+            editor.selected = None
+            editor.selectionId = None
+        editor._invalidate(removed)
+        editor._solveAgain()
+        return removed
+
+    def setField(self, item, field, value):
+        editor = self.editor
+        oldId = item.id
+        editor._invalidate(item)
+        if not editor.scene.setField(item, field, value):
+            return False
+        if editor.journal is not None:
+            editor.journal.field(oldId, field, value)
+        editor._invalidate(item)
+        editor._solveAgain()
+        return True
 
 class CircuitEditor(QWidget):
-    def __init__(self, *args, **kwargs):
+    # how close (manhattan, in scene px) the ghost has to get before animation stops
+    settleEpsilon = 0.5
+    # widget area covered by the mode/coordinates/hover text
+    hudHeight = 110
+    # spans shown under the HUD while profiling, as p50 / p95 / p99
+    profiledSpans = ["frame", "paint", "paint.tiles", "paint.static", "paint.ghost", "paint.overlay",
+                     "tick", "mouse", "hitTest", "ghostWire"]
+    # below these zoom values text fields are skipped and components become outlines
+    textDetailZoom = 0.6
+    symbolDetailZoom = 0.35
+    # ms of chunk decoding per event loop pass while a big file finishes loading
+    loadBudgetMs = 8
+    # how long an auto-route search may run per frame while the ghost wire is previewed
+    routeBudgetMs = 3
+
+    def __init__(self, *args, fps=60, profile=False, **kwargs):
         super().__init__(*args, **kwargs)
 
-        # intialize a timer that will be used to update the scene
-        
-        self.elapsedTimer = QElapsedTimer()
-        self.elapsedTimer.start()
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self._animateTick)
-        self.lastTime = self.elapsedTimer.elapsed()
-        self.timer.start()
+        # timing of the hot paths, toggled with F3 and exported with F4
+        self.profiler = Profiler(profile)
+        self.lastPaintNs = None
+
+        # the scene only animates while the ghost is catching up to the mouse,
+        # input events wake it back up
+        self.animation = AnimationScheduler(self._animateTick, fps, self)
 
         # set focus policy to accept key events
         self.setFocusPolicy(Qt.StrongFocus)
@@ -31,15 +122,32 @@ class CircuitEditor(QWidget):
 
         self.mouse_down = False
 
+        # mouse moves and wheel turns only record where the mouse is and how far
+        # it zoomed, hover and snapping are worked out once per frame in _flushInput()
+        self.inputPending = False
+        self.pendingMousePos = QPoint(0, 0)
+        self.pendingZoom = 0.0
+        self.panning = False
+        # input events seen, how many of them were folded into another, and frames that handled input
+        self.inputEvents = 0
+        self.foldedEvents = 0
+        self.inputFlushes = 0
+
         self.hoveredItemId = None
+        self.hovered = None
         self.selectionId = None
+        self.selected = None
         
         self.mode = "place" # place, edit, wire
 
-        self.items = [Resistor("R1", QPoint(0, 0), "west")]
-        self.wires = []
+        # committed wires and components are rasterized into tiles, the ghost
+        # and whatever is hovered or selected get drawn over them every frame
+        self.tiles = TileCache(self._drawStatic)
 
-        self.toPlace = Resistor("R2", QPoint(0, 0), "west")
+        self.scene = Scene()
+        self.scene.addItem(Resistor("R1", (0, 0), "west"))
+
+        self.toPlace = Resistor("R2", (0, 0), "west")
         self.ghostPos = QPointF(0, 0)
         self.toPlaceR = "west"
         self.lastTypingTime = 0
@@ -47,30 +155,157 @@ class CircuitEditor(QWidget):
         self.wireStart = None
         self.movedWire = False
         self.ghostWires = []
+        # wire mode routes around components instead of laying straight runs
+        self.autoRoute = False
+        # ((start, end, obstacle version), RouteSearch) of the last route, the
+        # ghost asks for the same one every frame, which carries on the search
+        self.lastRoute = None
+        self.lastGhostRect = None
+
+        # DC operating point, solved in the background on Shift+S
+        self.solver = SolveWorker(self)
+        self.solver.solved.connect(self._onSolved)
+        self.solver.failed.connect(self._onSolveFailed)
+        self.dcResult = None
+        # the last Shift+P sweep, shown instead of dcResult until the next solve
+        self.sweepResult = None
+        self.solveError = None
+        # once solved, edits re-solve at most once per frame
+        self.liveSolve = False
+        self.solvePending = False
 
         self.pan = QPoint(0, 0)
         self.zoom = 0.0
         self.zoomValue = 1.0
 
+        # binary file still being read in the background, and which of its chunks aren't in the scene yet
+        self.reader = None
+        self.unloaded = []
+
+        # autosave, off until startAutosave() is called
+        self.journal = None
+
+        # undo/redo, every edit goes through self.edits so it can be journaled and undone
+        self.edits = _SceneEdits(self)
+        self.history = History()
+
+        self.animation.wake()
+
     def _getNow(self):
-        return self.elapsedTimer.elapsed()
+        return self.animation.now()
 
-    def _animateTick(self):
-        now = self._getNow()
-        dtMs = now - self.lastTime
-        self.lastTime = now
+    def setFrameRate(self, fps):
+        self.animation.setFrameRate(fps)
+
+    @timed("tick")
+    def _animateTick(self, dtMs):
+        self._flushInput()
+        if self.solvePending:
+            self.solvePending = False
+            self._solve()
 
         snapped_pos = (self.mouse_pos) / 20 * 20
         self.ghostPos += (snapped_pos - self.ghostPos) * (1 - 0.1 ** (dtMs / 100))
 
+        settled = (QPointF(snapped_pos) - self.ghostPos).manhattanLength() < self.settleEpsilon
+        if settled:
+            self.ghostPos = QPointF(snapped_pos)
+
+        searching = False
         if self.mode == "wire" and self.wireStart is not None:
-            self._computeGhostWire(self.ghostPos)
+            self._computeGhostWire(self.ghostPos, self.routeBudgetMs)
+            searching = self.autoRoute and self.lastRoute is not None and not self.lastRoute[1].done
+
+        self._invalidateGhost()
+        return not settled or searching
+
+    def _sceneToWidget(self, rect):
+        left, top, right, bottom = rect
+        cx, cy = self.width() / 2, self.height() / 2
+        z = self.zoomValue
+        topLeft = QPoint(math.floor((left - self.pan.x()) * z + cx) - 1, math.floor((top - self.pan.y()) * z + cy) - 1)
+        bottomRight = QPoint(math.ceil((right - self.pan.x()) * z + cx) + 1, math.ceil((bottom - self.pan.y()) * z + cy) + 1)
+        return QRect(topLeft, bottomRight)
+
+    def _widgetToScene(self, rect):
+        cx, cy = self.width() / 2, self.height() / 2
+        z = self.zoomValue
+        return (math.floor((rect.left() - cx) / z + self.pan.x()), math.floor((rect.top() - cy) / z + self.pan.y()),
+                math.ceil((rect.right() - cx) / z + self.pan.x()), math.ceil((rect.bottom() - cy) / z + self.pan.y()))
+
+    def _invalidate(self, drawable):
+        if drawable is not None:
+            rect = drawable.paintRect()
+            self.tiles.invalidate(rect)
+            self.update(self._sceneToWidget(rect))
+
+    def _invalidateHud(self):
+        # full rows, the solver and sweep texts can be as wide as the window
+        height = self.hudHeight
+        if self.profiler.enabled:
+            height += 20 * (len(self.profiledSpans) + 1)
+        self.update(QRect(0, 0, self.width(), height))
+
+    def _ghostRect(self):
+        if self.mode == "place":
+            self.toPlace.set_pos(_asTuple(self.ghostPos))
+            self.toPlace.set_r(self.toPlaceR)
+            return self.toPlace.paintRect()
+        elif self.mode == "wire":
+            x, y = round(self.ghostPos.x()), round(self.ghostPos.y())
+            size = 10
+            rect = (x - size, y - size, x + size, y + size)
+            for wire in self.ghostWires:
+                rect = unionBounds(rect, wire.paintRect())
+            return rect
+        return None
 
-        self.update()
+    def _invalidateGhost(self):
+        # repaint where the ghost was last frame and where it is now
+        rect = self._ghostRect()
+        for dirty in [self.lastGhostRect, rect]:
+            if dirty is not None:
+                self.update(self._sceneToWidget(dirty))
+        self.lastGhostRect = rect
+
+    def _queueInput(self, pos):
+        self.pendingMousePos = pos
+        self.inputEvents += 1
+        if self.inputPending:
+            self.foldedEvents += 1
+        self.inputPending = True
+        self.animation.wake()
+
+    def _flushInput(self):
+        '''
+        Applies whatever input has come in since the last frame.
+        '''
+        if not self.inputPending:
+            return
+        self.inputPending = False
+        self.inputFlushes += 1
+
+        if self.pendingZoom != 0:
+            self.zoom += self.pendingZoom
+            self.zoomValue = 1.1 ** self.zoom
+            self.pendingZoom = 0.0
+            self.update()
+
+        self._updateMousePos(self.pendingMousePos)
+
+        # panning by the total distance moved covers every folded move at once
+        if self.panning:
+            self.pan = self.pan - (self.raw_mouse_pos - self.prev_raw_mouse_pos)
+            self.update()
+        else:
+            self._invalidateHud()
+
+    @timed("mouse")
+    def _updateMousePos(self, pos):
+        self.animation.wake()
 
-    def _updateMousePos(self, event: QMouseEvent):
         self.prev_raw_mouse_pos = self.raw_mouse_pos
-        self.raw_mouse_pos = event.pos()
+        self.raw_mouse_pos = pos
 
         # nasty math to update mouse pos
         self.mouse_pos = ((self.raw_mouse_pos - QPoint(self.width()//2, self.height()//2)) / self.zoomValue + self.pan)
@@ -78,12 +313,19 @@ class CircuitEditor(QWidget):
         old_grid_pos = self.mouse_grid_pos
         self.mouse_grid_pos = self.mouse_pos / 20 * 20
 
+        oldHovered, oldHoveredItemId = self.hovered, self.hoveredItemId
         res = self._hoveredTextId()
         if res is not None:
             item, hoveredTextId = res
+            self.hovered = item
             self.hoveredItemId = f"{item.id}:{hoveredTextId}"
         else:
-            self.hoveredItemId = self._hoveredItemId()
+            self.hovered = self._hoveredItem()
+            self.hoveredItemId = self.hovered.id if self.hovered is not None else None
+
+        if oldHoveredItemId != self.hoveredItemId:
+            self._invalidate(oldHovered)
+            self._invalidate(self.hovered)
 
         if old_grid_pos != self.mouse_grid_pos:
             if self.mode == "wire" and self.wireStart is not None:
@@ -91,14 +333,220 @@ class CircuitEditor(QWidget):
 
         return old_grid_pos != self.mouse_grid_pos
 
+    def _solve(self):
+        self._finishLoading()
+        try:
+            elements = extractCircuit(self.scene)
+        except ValueError as e:
+            self._onSolveFailed(str(e))
+            return
+        self.solver.submit(elements)
+
+    def _solveAgain(self):
+        if self.liveSolve:
+            self.solvePending = True
+            self.animation.wake()
+
+    def _askSweep(self):
+        if self.selected is None:
+            return
+        id = self.selected.id
+        text, ok = QInputDialog.getText(self, "Sweep", f"Sweep {id} over (from, to, points):", text="100, 10k, 50")
+        if not ok:
+            return
+        self._finishLoading()
+        try:
+            parts = text.split(",")
+            if len(parts) != 3 or int(parts[2]) < 2:
+                raise ValueError("A sweep needs a start, an end and at least 2 points.")
+            values = np.linspace(parseValue(parts[0]), parseValue(parts[1]), int(parts[2]))
+            elements = extractCircuit(self.scene)
+        except ValueError as e:
+            self._onSolveFailed(str(e))
+            return
+        self.solver.submitSweep(elements, id, values)
+
+    def _onSolved(self, result):
+        if isinstance(result, SweepResult):
+            self.dcResult, self.sweepResult = None, result
+        else:
+            self.dcResult, self.sweepResult = result, None
+        self.solveError = None
+        self._invalidateHud()
+
+    def _onSolveFailed(self, message):
+        self.dcResult = self.sweepResult = None
+        self.solveError = message
+        self._invalidateHud()
+
+    def _solveText(self):
+        if self.solveError is not None:
+            return self.solveError
+        if self.hovered is None:
+            return None
+        id = self.hovered.id
+        sweep = self.sweepResult
+        if sweep is not None:
+            if id not in sweep.voltages:
+                return None
+            v = sweep.voltages[id]
+            return f"{id}: {v.min():.4g} .. {v.max():.4g} V as {sweep.id} goes {sweep.values[0]:.4g} .. {sweep.values[-1]:.4g}"
+        if self.dcResult is None:
+            return None
+        if id not in self.dcResult.voltages:
+            return None
+        return f"{id}: {self.dcResult.voltages[id]:.4g} V, {self.dcResult.currents[id]:.4g} A"
+
+    def startAutosave(self, directory):
+        '''
+        Journals every edit into directory, or a numbered one next to it if
+        another editor is using it. If that holds an autosave, e.g. after a
+        crash, the circuit is restored first.
+        '''
+        self.journal = lockedJournal(directory)
+        if self.journal is None:
+            # every slot is held by a running editor, this one goes without
+            return
+        try:
+            recovered = self.journal.recover()
+        except ValueError as e:
+            aside = self.journal.setAside()
+            QMessageBox.warning(self, "Autosave", f"{e}\n\nIt was moved to {aside}.")
+            recovered = None
+        if recovered is not None:
+            self._setScene(recovered)
+        else:
+            self.journal.start(self.scene)
+
+    def openFile(self, path):
+        '''
+        Replaces the scene with the circuit in path. Binary files show what's
+        in view straight away and load the rest between events.
+        '''
+        self._finishLoading()
+        if path.lower().endswith(".json"):
+            self._setScene(loadJson(path))
+            if self.journal is not None:
+                self.journal.startFrom(path)
+            return
+
+        reader = CircuitReader(path)
+        scene = Scene()
+        # edits can happen before everything has loaded, they mustn't clash with what's still to come
+        scene.reserve(reader.ids(), reader.positions())
+        try:
+            for chunk in reader.chunksIn(self._widgetToScene(self.rect())):
+                loadChunk(scene, reader, chunk)
+        except ValueError:
+            reader.close()
+            raise
+
+        self._setScene(scene)
+        self.reader = reader
+        self.unloaded = [True] * len(reader)
+        for chunk in reader.chunksIn(self._widgetToScene(self.rect())):
+            self.unloaded[chunk] = False
+        if self.journal is not None:
+            self.journal.startFrom(path)
+        self._loadMore()
+
+    def saveFile(self, path):
+        self._finishLoading()
+        saveCircuit(self.scene, path)
+
+    def _setScene(self, scene):
+        self.scene = scene
+        self.hovered = self.selected = None
+        self.hoveredItemId = self.selectionId = None
+        self.wireStart = None
+        self.ghostWires = []
+        # keyed on the old scene's obstacle version, which the new one can repeat
+        self.lastRoute = None
+        self.dcResult = self.sweepResult = self.solveError = None
+        self.liveSolve = self.solvePending = False
+        self.history.clear()
+        self.toPlace.id = self._nextComponentID(self.toPlace.symbol)
+        self.tiles.clear()
+        self.update()
+
+    def _loadMore(self, budgetMs=None):
+        if self.reader is None:
+            return
+        deadline = self._getNow() + (self.loadBudgetMs if budgetMs is None else budgetMs)
+        # whatever has scrolled into view goes first
+        order = [chunk for chunk in self.reader.chunksIn(self._widgetToScene(self.rect())) if self.unloaded[chunk]]
+        order += [chunk for chunk, unloaded in enumerate(self.unloaded) if unloaded]
+        for chunk in order:
+            if not self.unloaded[chunk]:
+                continue
+            self.unloaded[chunk] = False
+            try:
+                rect = loadChunk(self.scene, self.reader, chunk)
+            except ValueError as e:
+                self._stopLoading()
+                QMessageBox.warning(self, "Open circuit", f"Only part of the circuit could be loaded: {e}")
+                return
+            self.tiles.invalidate(rect)
+            self.update(self._sceneToWidget(rect))
+            if self._getNow() >= deadline:
+                QTimer.singleShot(0, self._loadMore)
+                return
+        self._stopLoading()
+
+    def _stopLoading(self):
+        self.reader.close()
+        self.reader = None
+        self.unloaded = []
+        # whatever didn't make it in isn't coming any more
+        self.scene.pendingIds.clear()
+        self.scene.pendingAt.clear()
+
+    def _finishLoading(self):
+        self._loadMore(math.inf)
+
+    def _askOpen(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Open circuit", "", "Circuits (*.circ *.json)")
+        if path:
+            try:
+                self.openFile(path)
+            except (OSError, ValueError) as e:
+                QMessageBox.warning(self, "Open circuit", str(e))
+
+    def _toggleProfiler(self):
+        self.profiler.enabled = not self.profiler.enabled
+        self.lastPaintNs = None
+        self.update()
+
+    def _askExportProfile(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export timings", "timings.csv", "CSV (*.csv)")
+        if path:
+            try:
+                self.profiler.export(path)
+            except OSError as e:
+                QMessageBox.warning(self, "Export timings", str(e))
+
+    def _askSave(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Save circuit", "", "Circuit (*.circ);;JSON (*.json)")
+        if path:
+            try:
+                self.saveFile(path)
+            except (OSError, ValueError) as e:
+                QMessageBox.warning(self, "Save circuit", str(e))
+
     def _nextComponentID(self, prefix):
-        idNum = 1
-        while True:
-            id = f"{prefix}{idNum}"
-            if not any(item.id == id for item in self.items):
-                break
-            idNum += 1
-        return id
+        return self.scene.nextId(prefix)
+
+    def _removeSelection(self):
+        if self.selected is not None:
+            self.history.do(RemoveObjects([self.selected]), self.edits)
+
+    def _undo(self):
+        if self.history.undo(self.edits):
+            self.toPlace.id = self._nextComponentID(self.toPlace.symbol)
+
+    def _redo(self):
+        if self.history.redo(self.edits):
+            self.toPlace.id = self._nextComponentID(self.toPlace.symbol)
 
     def _placeItem(self):
         snapped_pos = (self.mouse_pos) / 20 * 20
@@ -109,90 +557,104 @@ class CircuitEditor(QWidget):
         if self._alreadyItemAt(snapped_pos):
             return
 
-        new_item = copy.deepcopy(self.toPlace)
-        new_item.set_pos(snapped_pos)
+        # the model only holds strings and tuples, so a shallow copy is a full one
+        new_item = copy.copy(self.toPlace)
+        new_item.set_pos(_asTuple(snapped_pos))
         new_item.set_r(self.toPlaceR)
 
-        # generate a unique id
+        # the ghost's id may have been taken by a rename since it was picked
+        if self.scene.idTaken(new_item.id):
+            new_item.id = self._nextComponentID(self.toPlace.symbol)
 
-        self.items.append(new_item)
+        self.history.do(AddObjects(items=[new_item]), self.edits)
         self.toPlace.id = self._nextComponentID(self.toPlace.symbol)
-        self.update()
+        self._invalidateGhost()
 
     def _placeWire(self):
         self._computeGhostWire(self.mouse_grid_pos)
+        # ids have to be handed out one at a time since each add reserves one
         for wire in self.ghostWires:
-            idNum = 1
-            while True:
-                id = f"wire{idNum}"
-                if not any(wire.id == id for wire in self.wires):
-                    break
-                idNum += 1
-            wire.id = id
-            self.wires.append(wire)
+            wire.id = self.scene.nextId("wire")
+            self.edits.addWire(wire)
+        if self.ghostWires:
+            self.history.push(AddObjects(wires=self.ghostWires))
         self.wireStart = None
         self.ghostWires = []
 
-    def _hoveredItemId(self):
-        for wire in self.wires:
-            if wire.in_bounds(self.mouse_pos):
-                return wire.id
-        for item in self.items:
-            if item.in_bounds(self.mouse_pos):
-                return item.id
+    @timed("hitTest")
+    def _hoveredItem(self):
+        pos = (self.mouse_pos.x(), self.mouse_pos.y())
+        # wires take priority over components
+        wireHits = self.scene.wireStore.hitTest(pos)
+        if wireHits:
+            return self.scene.wires[wireHits[0]]
+        hits = self.scene.hitIndex.query(pos)
+        if hits:
+            return hits[0]
         return None
 
+    @timed("hitTest")
     def _hoveredTextId(self):
-        for item in self.items:
-            textId = item.in_text_bounds(self.mouse_pos)
-            if textId is not None:
-                return (item, textId)
+        hits = self.scene.textIndex.query((self.mouse_pos.x(), self.mouse_pos.y()))
+        if hits:
+            return hits[0]
         return None
 
+    def _drawDrawable(self, painter, drawable, is_ghost=False, is_hovered=False, is_selected=False, textHovered=None):
+        if not isinstance(drawable, Wire) and self.zoomValue < self.symbolDetailZoom:
+            drawItemOutline(painter, drawable, is_ghost, is_hovered, is_selected)
+        else:
+            showText = self.zoomValue >= self.textDetailZoom
+            drawDrawable(painter, drawable, is_ghost, is_hovered, is_selected, textHovered, showText)
+
     def _drawGhost(self, painter):
-        self.toPlace.set_pos(self.ghostPos.toPoint())
+        self.toPlace.set_pos(_asTuple(self.ghostPos))
         self.toPlace.set_r(self.toPlaceR)
-        self.toPlace.draw(painter, is_ghost=True)
+        self._drawDrawable(painter, self.toPlace, is_ghost=True)
 
     def _drawGhostWire(self, painter):
         if self.wireStart is None:
-            Wire.drawWireCursor(painter, self.mouse_grid_pos)
+            drawWireCursor(painter, self.mouse_grid_pos)
         for wire in self.ghostWires:
-            wire.draw(painter, is_ghost=True)
+            drawWire(painter, wire, is_ghost=True)
 
-    def _computeGhostWire(self, endPos):
+    @timed("ghostWire")
+    def _computeGhostWire(self, endPos, routeBudgetMs=None):
         if self.wireStart is None:
             return
         
-        snapped_pos = endPos
+        snapped_pos = _asTuple(endPos)
 
-        # if its a QPointF, convert it to QPoint
-        if isinstance(snapped_pos, QPointF):
-            snapped_pos = snapped_pos.toPoint()
+        if self.autoRoute:
+            # until the search is done the preview falls back to straight runs
+            corners = self._route(self.wireStart, (round(snapped_pos[0] / grid) * grid, round(snapped_pos[1] / grid) * grid), routeBudgetMs)
+            if corners is not None:
+                self.ghostWires = [Wire("ghost", a, b) for a, b in zip(corners, corners[1:])]
+                return
 
-        offset = snapped_pos - self.wireStart
+        offset = (snapped_pos[0] - self.wireStart[0], snapped_pos[1] - self.wireStart[1])
 
-        if offset == QPoint(0, 0):
+        if offset == (0, 0):
             self.ghostWires = []
             return
 
-        if abs(offset.x()) > abs(offset.y()):
-            latVal = lambda p: p.x()
-            ortVal = lambda p: p.y()
-            setOrthogonal = lambda p, v: p.setY(v)
-            dirs = ["west", "east"] if offset.x() > 0 else ["east", "west"]
+        if abs(offset[0]) > abs(offset[1]):
+            latVal = lambda p: p[0]
+            ortVal = lambda p: p[1]
+            snapped_pos = (snapped_pos[0], self.wireStart[1])
+            portsAlong = self.scene.portIndex.portsInRow
+            dirs = ["west", "east"] if offset[0] > 0 else ["east", "west"]
         else:
-            latVal = lambda p: p.y()
-            ortVal = lambda p: p.x()
-            setOrthogonal = lambda p, v: p.setX(v)
-            dirs = ["north", "south"] if offset.y() > 0 else ["south", "north"]
-
-        setOrthogonal(snapped_pos, ortVal(self.wireStart))
+            latVal = lambda p: p[1]
+            ortVal = lambda p: p[0]
+            snapped_pos = (self.wireStart[0], snapped_pos[1])
+            portsAlong = self.scene.portIndex.portsInColumn
+            dirs = ["north", "south"] if offset[1] > 0 else ["south", "north"]
 
         bounds = sorted([latVal(self.wireStart), latVal(snapped_pos)])
 
-        allPorts = self._allPorts()
-        portsOfInterest = [port for port in allPorts if ortVal(port.pos) == ortVal(self.wireStart) and bounds[0] <= latVal(port.pos) <= bounds[1]]
+        # already sorted by position, the sort below only flips direction and breaks ties
+        portsOfInterest = portsAlong(ortVal(self.wireStart), bounds[0], bounds[1])
 
         isPosDir = latVal(offset) > 0
         portsOfInterest.sort(key=lambda port: latVal(port.pos) * (1 if isPosDir else -1) + (0.1 if port.direction == dirs[1] else 0)) # iffy
@@ -216,22 +678,24 @@ class CircuitEditor(QWidget):
         self.ghostWires = ghostWires
 
 
+    def _route(self, start, end, budgetMs=None):
+        '''
+        Returns the auto-routed corners from start to end, or None if there's
+        no route or the search hasn't finished within budgetMs.
+        '''
+        key = (start, end, self.scene.obstacles.version)
+        if self.lastRoute is None or self.lastRoute[0] != key:
+            self.lastRoute = (key, RouteSearch(self.scene.obstacles, start, end))
+        search = self.lastRoute[1]
+        search.run(budgetMs)
+        return search.corners
+
     def _alreadyItemAt(self, pos):
-        for item in self.items:
-            if item.pos == pos:
-                return True
-        return False
+        return self.scene.positionTaken(_asTuple(pos))
     
-    def _allPorts(self):
-        ports = []
-        for item in self.items:
-            ports += item.getPorts()
-        for wire in self.wires:
-            ports += wire.getPorts()
-        return ports
-
     def mousePressEvent(self, event: QMouseEvent):
-        self._updateMousePos(event)
+        self._queueInput(event.pos())
+        self._flushInput()
         shifted = (event.modifiers() & Qt.ShiftModifier) == Qt.ShiftModifier
 
         if shifted:
@@ -242,7 +706,7 @@ class CircuitEditor(QWidget):
                     self._placeItem()
                 elif self.mode == "wire":
                     if self.wireStart is None:
-                        self.wireStart = self.mouse_grid_pos
+                        self.wireStart = _asTuple(self.mouse_grid_pos)
                         self.movedWire = False
                     else:
                         self._placeWire()
@@ -253,92 +717,120 @@ class CircuitEditor(QWidget):
 
                         # open a dialog to edit the value
                         qstr, ok = QInputDialog.getText(self, "Edit Value", "Enter the new value:")
-                        if ok:
-                            for item in self.items:
-                                if item.id == itemId:
-                                    item.__setattr__(textId, qstr)
+                        item = self.scene.get(itemId)
+                        if ok and item is not None:
+                            old = getattr(item, textId)
+                            if self.edits.setField(item, textId, qstr):
+                                self.history.push(SetField(item, textId, old, qstr))
                     else:
+                        self._invalidate(self.selected)
                         self.selectionId = self.hoveredItemId
+                        self.selected = self.hovered
+                        self._invalidate(self.selected)
                     # if self.hoveredItemId is not None:
 
 
         self.mouse_down = True
-        self.update()
+        self._invalidateHud()
 
     def mouseMoveEvent(self, event: QMouseEvent):
-        self._updateMousePos(event)
-
         # drag logic
-        if self.mouse_down and (event.modifiers() & Qt.ShiftModifier):
-            self.pan = self.pan - (self.raw_mouse_pos - self.prev_raw_mouse_pos)
-
-        self.update()
+        self.panning = self.mouse_down and bool(event.modifiers() & Qt.ShiftModifier)
+        self._queueInput(event.pos())
 
     def mouseReleaseEvent(self, event: QMouseEvent):
+        self._flushInput()
         self.mouse_down = False
+        self.panning = False
 
         if self.mode == "wire" and self.wireStart is not None:
             if self.movedWire:
                 self._placeWire()
 
-        self.update()
-
     def wheelEvent(self,event):
-        self.zoom += event.angleDelta().y() / 120
-        self.zoomValue = 1.1 ** self.zoom
-        self._updateMousePos(event)
-        self.update()
+        self.pendingZoom += event.angleDelta().y() / 120
+        self._queueInput(event.pos())
     
     def keyPressEvent(self, event):
         super().keyPressEvent(event)
+        self._flushInput()
+        self.animation.wake()
 
         shiftKey = (event.modifiers() & Qt.ShiftModifier) == Qt.ShiftModifier
+        ctrlKey = (event.modifiers() & Qt.ControlModifier) == Qt.ControlModifier
 
         if event.isAutoRepeat():
             return
         
-        if event.key() == Qt.Key.Key_Escape:
+        if ctrlKey:
+            if event.key() == Qt.Key.Key_O:
+                self._askOpen()
+            elif event.key() == Qt.Key.Key_S:
+                self._askSave()
+            elif event.key() == Qt.Key.Key_Z and shiftKey or event.key() == Qt.Key.Key_Y:
+                self._redo()
+            elif event.key() == Qt.Key.Key_Z:
+                self._undo()
+            self.update()
+            return
+
+        if event.key() == Qt.Key.Key_F3:
+            self._toggleProfiler()
+        elif event.key() == Qt.Key.Key_F4:
+            self._askExportProfile()
+        elif event.key() == Qt.Key.Key_Escape:
             if self.mode == "wire" and self.wireStart is not None:
                 self.wireStart = None
                 self.ghostWires = []
             elif self.selectionId is not None:
+                self._invalidate(self.selected)
                 self.selectionId = None
+                self.selected = None
             else:
                 self.mode = "edit"
         elif event.key() == Qt.Key.Key_R and not shiftKey:
             self.toPlaceR = nextDirection(self.toPlaceR)
         elif event.key() == Qt.Key.Key_W and shiftKey:
             self.mode = "wire"
+            self.autoRoute = False
+        elif event.key() == Qt.Key.Key_A and shiftKey:
+            # wire, routed around components
+            self.mode = "wire"
+            self.autoRoute = True
         elif event.key() == Qt.Key.Key_R and shiftKey:
             # resistor
             self.mode = "place"
-            self.toPlace = Resistor(self._nextComponentID("R"), QPoint(0, 0), "west")
+            self.toPlace = Resistor(self._nextComponentID("R"), (0, 0), "west")
         elif event.key() == Qt.Key.Key_C and shiftKey:
             # capacitor
             self.mode = "place"
-            self.toPlace = Capacitor(self._nextComponentID("C"), QPoint(0, 0), "west")
+            self.toPlace = Capacitor(self._nextComponentID("C"), (0, 0), "west")
         elif event.key() == Qt.Key.Key_V and shiftKey:
             # voltage source
             self.mode = "place"
-            self.toPlace = VoltageSource(self._nextComponentID("V"), QPoint(0, 0), "west")
+            self.toPlace = VoltageSource(self._nextComponentID("V"), (0, 0), "west")
         elif event.key() == Qt.Key.Key_G and shiftKey:
             # ground
             self.mode = "place"
-            self.toPlace = Ground(self._nextComponentID("G"), QPoint(0, 0), "west")
+            self.toPlace = Ground(self._nextComponentID("G"), (0, 0), "west")
+        elif event.key() == Qt.Key.Key_S and shiftKey:
+            self.liveSolve = True
+            self._solve()
+        elif event.key() == Qt.Key.Key_P and shiftKey:
+            # sweep the selected component's value
+            self._askSweep()
         elif event.key() == Qt.Key.Key_Backspace or event.key() == Qt.Key.Key_X:
             if self.selectionId is not None:
-                if self.selectionId.startswith("wire"):
-                    self.wires = [wire for wire in self.wires if wire.id != self.selectionId]
-                else:
-                    self.items = [item for item in self.items if item.id != self.selectionId]
+                self._removeSelection()
                 self.selectionId = None
+                self.selected = None
         
         if event.key() == Qt.Key.Key_Backspace:
             if self.mode == "place":
                 self.toPlace.setPrimaryField("")
         else:
             if self.mode == "place":
-                if len(event.text()) == 1 and "0123456789numkMG".find(event.text()) != -1:
+                if len(event.text()) == 1 and "0123456789.pnumkMG".find(event.text()) != -1:
                     v = ""
                     if self._getNow() - self.lastTypingTime < 500:
                         v = self.toPlace.getPrimaryField()
@@ -351,53 +843,105 @@ class CircuitEditor(QWidget):
 
             
 
+    @timed("paint.static")
+    def _drawStatic(self, painter, rect):
+        # everything committed inside rect, minus what the overlay draws
+        overlay = [d.id for d in [self.hovered, self.selected] if d is not None]
+        wires = self.scene.wireStore
+        drawWires(painter, wires.lines(wires.rowsIn(rect, exclude=overlay)))
+
+        for item in self.scene.paintIndex.queryRect(rect):
+            if item is not self.hovered and item is not self.selected:
+                self._drawDrawable(painter, item)
+
+    def _drawOverlay(self, painter):
+        textHovered = None
+        if self.hoveredItemId is not None and self.hoveredItemId.find(":") != -1:
+            textHovered = self.hoveredItemId.split(":")[1]
+
+        overlay = []
+        for d in [self.hovered, self.selected]:
+            if d is not None and d not in overlay:
+                overlay.append(d)
+        # wires under components, same as the static layer
+        overlay.sort(key=lambda d: not isinstance(d, Wire))
+
+        for d in overlay:
+            hovered = d.id == self.hoveredItemId and self.mode == "edit"
+            selected = d.id == self.selectionId
+            self._drawDrawable(painter, d, is_hovered=hovered, is_selected=selected, textHovered=textHovered if d is self.hovered else None)
+
     def paintEvent(self, event: QPaintEvent):
+        profiler = self.profiler
+        if profiler.enabled:
+            # time since the previous paint, what the user sees as frame time.
+            # Only counted from paints made while animating, otherwise the
+            # idle gap before the next input would show up as one long frame
+            now = time.perf_counter_ns()
+            if self.lastPaintNs is not None:
+                profiler.add("frame", self.lastPaintNs, now - self.lastPaintNs)
+            self.lastPaintNs = now if self.animation.isActive() else None
+
+        with profiler.span("paint"):
+            self._paint(event, profiler)
+
+    def _paint(self, event, profiler):
         painter = QPainter()
         painter.begin(self)
         painter.setPen(Qt.black)
 
-        # viewport transformation
-        painter.translate(self.width()/2, self.height()/2)
+        # blit the cached static layer for the area being repainted
+        with profiler.span("paint.tiles"):
+            z = self.zoomValue
+            dpr = self.devicePixelRatioF()
+            size = self.tiles.devicePixelSize(dpr)
+            # snapped to whole device pixels so tiles aren't resampled when blitted
+            originX = round((self.width()/2 - self.pan.x() * z) * dpr)
+            originY = round((self.height()/2 - self.pan.y() * z) * dpr)
+            xs, ys = self.tiles.tileSpan(z, self._widgetToScene(event.rect()))
+            for tx in xs:
+                for ty in ys:
+                    tile = self.tiles.tile(self.zoom, z, tx, ty, dpr)
+                    painter.drawPixmap(QPointF((tx * size + originX) / dpr, (ty * size + originY) / dpr), tile)
+
+        # viewport transformation, from the same snapped origin as the tiles
+        painter.translate(originX / dpr, originY / dpr)
         painter.scale(self.zoomValue, self.zoomValue)
-        painter.translate(-self.pan)
 
         # draw ghost
-        if self.mode == "place":
-            dist = (self.ghostPos - self.mouse_grid_pos).manhattanLength()
-            if dist > 2 or not self._alreadyItemAt(self.mouse_grid_pos):
-                self._drawGhost(painter)
-        elif self.mode == "wire":
-            if self.wireStart is not None:
-                self._drawGhostWire(painter)
-            Wire.drawWireCursor(painter, self.ghostPos)
-        
-
-        # draw wires
-        for wire in self.wires:
-            hovered = wire.id == self.hoveredItemId and self.mode == "edit"
-            selected = wire.id == self.selectionId
-            wire.draw(painter, is_hovered=hovered, is_selected=selected)
-
-        # draw components
-        for item in self.items:
-            hovered = item.id == self.hoveredItemId and self.mode == "edit"
-            
-            textHovered = None
-            if self.hoveredItemId is not None and self.hoveredItemId.find(":") != -1:
-                itemId, textId = self.hoveredItemId.split(":")
-                if item.id == itemId:
-                    textHovered = textId
-
-            selected = item.id == self.selectionId
-            item.draw(painter, is_hovered=hovered, is_selected=selected, textHovered=textHovered)
+        with profiler.span("paint.ghost"):
+            if self.mode == "place":
+                dist = (self.ghostPos - self.mouse_grid_pos).manhattanLength()
+                if dist > 2 or not self._alreadyItemAt(self.mouse_grid_pos):
+                    self._drawGhost(painter)
+            elif self.mode == "wire":
+                if self.wireStart is not None:
+                    self._drawGhostWire(painter)
+                drawWireCursor(painter, self.ghostPos)
+
+        # hovered and selected things
+        with profiler.span("paint.overlay"):
+            self._drawOverlay(painter)
 
         # draw UI stuff
         painter.resetTransform()
+        painter.setOpacity(1.0)
         painter.setPen(Qt.black)
 
         # mode
-        painter.drawText(10, 20, self.mode)
+        painter.drawText(10, 20, self.mode + (" (auto-route)" if self.mode == "wire" and self.autoRoute else ""))
         painter.drawText(10, 40, f"{self.mouse_pos.x()}, {self.mouse_pos.y()}")
         painter.drawText(10, 60, self.hoveredItemId)
+        painter.drawText(10, 80, self._solveText())
+        painter.drawText(10, 100, f"input: {self.inputEvents} events, {self.foldedEvents} folded")
+
+        if profiler.enabled:
+            painter.drawText(10, 120, "timings, p50 / p95 / p99:")
+            y = 140
+            for name in self.profiledSpans:
+                ps = profiler.percentiles(name)
+                if ps is not None:
+                    painter.drawText(10, y, f"{name}: {ps[0]:.2f} / {ps[1]:.2f} / {ps[2]:.2f} ms")
+                y += 20
     
         painter.end()
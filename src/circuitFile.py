@@ -0,0 +1,93 @@
+import json
+import os
+
+from model import Wire, componentTypes
+from scene import Scene
+from circuitBinary import checkGeometry, saveBinary, loadBinary
+
+
+def componentToDict(item):
+    component = {"type": item.symbol, "id": item.id, "x": item.pos[0], "y": item.pos[1], "r": item.r}
+    if item.primaryField != "":
+        component["value"] = item.getPrimaryField()
+    return component
+
+
+def componentFromDict(component, check=True):
+    '''
+    Raises ValueError if the component is out of range, unless check is False
+    because the caller checks a whole batch at once.
+    '''
+    cls = componentTypes[component["type"]]
+    item = cls(component["id"], (int(component["x"]), int(component["y"])), component["r"])
+    if "value" in component:
+        item.setPrimaryField(component["value"])
+    if check:
+        checkGeometry([item.pos], ())
+    return item
+
+
+def wireToDict(wire):
+    return {"id": wire.id, "start": list(wire.start), "end": list(wire.end)}
+
+
+def wireFromDict(wire, check=True):
+    '''
+    Raises ValueError if the wire is out of range or diagonal, unless check is
+    False because the caller checks a whole batch at once.
+    '''
+    wire = Wire(wire["id"], tuple(map(int, wire["start"])), tuple(map(int, wire["end"])))
+    if check:
+        checkGeometry((), [wire.start + wire.end])
+    return wire
+
+
+def sceneToDict(scene):
+    return {
+        "components": [componentToDict(item) for item in scene.items.values()],
+        "wires": [wireToDict(wire) for wire in scene.wires.values()],
+    }
+
+
+def sceneFromDict(data):
+    '''
+    Builds a scene from the dict sceneToDict makes. Raises ValueError if it's malformed.
+    '''
+    scene = Scene()
+    try:
+        items = [componentFromDict(component, check=False) for component in data["components"]]
+        wires = [wireFromDict(wire, check=False) for wire in data["wires"]]
+        checkGeometry([item.pos for item in items], [wire.start + wire.end for wire in wires])
+        for item in items:
+            scene.addItem(item)
+        for wire in wires:
+            scene.addWire(wire)
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Malformed circuit: {e!r}")
+    return scene
+
+
+def saveJson(scene, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(sceneToDict(scene), f, indent=1)
+
+
+def loadJson(path):
+    with open(path, encoding="utf-8") as f:
+        return sceneFromDict(json.load(f))
+
+
+def saveCircuit(scene, path):
+    '''
+    Saves as JSON if the path ends in .json and in the binary format otherwise.
+    '''
+    if os.path.splitext(path)[1].lower() == ".json":
+        saveJson(scene, path)
+    else:
+        saveBinary(scene, path)
+
+
+def loadCircuit(path):
+    if os.path.splitext(path)[1].lower() == ".json":
+        return loadJson(path)
+    return loadBinary(path)
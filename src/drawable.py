@@ -1,331 +1,106 @@
+'''
+Qt drawing for the circuit model in model.py.
+'''
+import numpy as np
 from PyQt5.QtCore import Qt, QPoint, QRect
-from PyQt5.QtGui import QPen
+from PyQt5.QtGui import QPen, QPainterPath, QPolygon
 
+from model import Wire, getForDir
 
-def nextDirection(r):
-    dirs = {"west": "north", "north": "east", "east": "south", "south": "west"}
-    return dirs[r]
+_alignments = {"center": Qt.AlignCenter, "left": Qt.AlignLeft}
 
-def fallBackDirection(r, available):
-    # todo: Refactor LMAO
-    fallbacks = {
-        "west": ["west", "horizontal", "all"],
-        "north": ["north", "vertical", "all"],
-        "east": ["east", "horizontal", "all"],
-        "south": ["south", "vertical", "all"]
-    }
-    for f in fallbacks[r]:
-        if f in available:
-            return f
-    raise ValueError(f"No fallback direction available for {r}. This should never happen.")
+# (class, r) -> QPainterPath, filled in the first time each one is drawn
+_symbolCache = {}
+# TextField -> QRect, the fields are shared class data so this stays small
+_textRectCache = {}
 
-def getForDir(r, mapping):
-    theDir = fallBackDirection(r, mapping.keys())
-    return mapping[theDir]
 
-########################################################### 
+def toQRect(rect):
+    return QRect(QPoint(rect[0], rect[1]), QPoint(rect[2], rect[3]))
 
-class Port():
-    def __init__(self, name, pos, direction):
-        self.name = name
-        self.pos = pos
-        self.direction = direction
+def _set_pen(painter, is_ghost, is_hovered, is_selected):
+    penColor = Qt.blue if is_selected else Qt.black
+    painter.setPen(QPen(penColor, 2, Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin))
 
-class TextField():
-    def __init__(self, id, rect, align, fmt="{}"):
-        self.id = id
-        self.rect = rect
-        self.align = align
-        self.format = fmt
-
-class Drawable():
-    def __init__(self):
-        pass
-
-    def in_bounds(self, pos):
-        '''
-        Returns True if the given position is within the bounds of the drawable.
-        '''
-        raise NotImplementedError
-    
-    def in_text_bounds(self, pos):
-        '''
-        If the given position is within the bounds of some text within the drawable,
-        return the id of the text. Otherwise, return None.
-        '''
-        raise NotImplementedError
-
-    def _set_pen(self, painter, is_ghost, is_hovered, is_selected):
-        penColor = Qt.blue if is_selected else Qt.black
-        painter.setPen(QPen(penColor, 2, Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin))
-        
-        if is_ghost:
-            painter.setOpacity(0.3)
-        elif is_hovered:
-            painter.setOpacity(0.5)
-        else:
-            painter.setOpacity(1.0)
-
-    def getPorts(self):
-        raise NotImplementedError
-
-    def draw(self, painter, is_ghost=False, is_hovered=False, is_selected=False, textHovered=None):
-        raise NotImplementedError
-
-###########################################################
-
-class Wire(Drawable):
-    def __init__(self, id, start, end):
-        super().__init__()
-        self.id = id
-        self.start = start
-        self.end = end
-
-    def getPorts(self):
-        return (Port("start", self.start, "none"), Port("end", self.end, "none"))
-    
-    def getDirection(self):
-        if self.start.x() == self.end.x():
-            return "vertical"
-        elif self.start.y() == self.end.y():
-            return "horizontal"
-        else:
-            raise ValueError("Wire is not horizontal or vertical.")
-
-    def in_bounds(self, pos):
-        margin = 6
-        topLeft = QPoint(min(self.start.x(), self.end.x()) - margin, min(self.start.y(), self.end.y()) - margin)
-        bottomRight = QPoint(max(self.start.x(), self.end.x()) + margin, max(self.start.y(), self.end.y()) + margin)
-        return QRect(topLeft, bottomRight).contains(pos)
-    
-    def in_text_bounds(self, pos):
-        return None
-
-    def draw(self, painter, is_ghost=False, is_hovered=False, is_selected=False, textHovered=None):
-        self._set_pen(painter, is_ghost, is_hovered, is_selected)
-        painter.drawLine(self.start, self.end)
-
-    @staticmethod
-    def drawWireCursor(painter, mousePos):
-        size = 8
-        painter.setPen(QPen(Qt.black, 2, Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin))
+    if is_ghost:
+        painter.setOpacity(0.3)
+    elif is_hovered:
         painter.setOpacity(0.5)
-        painter.drawLine(mousePos + QPoint(-size, 0), mousePos + QPoint(size, 0))
-        painter.drawLine(mousePos + QPoint(0, -size), mousePos + QPoint(0, size))
+    else:
+        painter.setOpacity(1.0)
 
 ###########################################################
 
-class Component(Drawable):
-    symbol = "-"
-    ports = {
-        "all": []
-    }
-    boundingBox = {
-        "all": QRect()
-    }
-    textFields = {
-        "all": []
-    }
-    primaryField = ""
-
-    def __init__(self, id, pos, r):
-        super().__init__()
-        self.pos = pos
-        self.id = id
-        self.r = r
-
-    def getPrimaryField(self):
-        if self.primaryField == "":
-            return ""
-        return getattr(self, self.primaryField)
-
-    def setPrimaryField(self, value):
-        if self.primaryField == "":
-            return
-        setattr(self, self.primaryField, value)
-
-    def getPorts(self):
-        return [Port(port.name, port.pos + self.pos, port.direction) for port in getForDir(self.r, self.ports)]
-
-    def in_bounds(self, pos):
-        return getForDir(self.r, self.boundingBox).contains(pos - self.pos)
-    
-    def in_text_bounds(self, pos):
-        for textField in getForDir(self.r, self.textFields):
-            if textField.rect.translated(self.pos).contains(pos):
-                return textField.id
-    
-    def set_pos(self, pos):
-        self.pos = pos
-    def set_r(self, r):
-        self.r = r
-
-    def _drawTextFields(self, painter, is_ghost=False, textHovered=None):
-        for textField in getForDir(self.r, self.textFields):
-            painter.setOpacity(0.5 if textField.id == textHovered else 0.3 if (is_ghost and textField.id != self.primaryField) else 1.0)
-            painter.drawText(textField.rect.translated(self.pos), textField.align, textField.format.format(getattr(self, textField.id)))
+def drawWire(painter, wire, is_ghost=False, is_hovered=False, is_selected=False):
+    _set_pen(painter, is_ghost, is_hovered, is_selected)
+    painter.drawLine(wire.start[0], wire.start[1], wire.end[0], wire.end[1])
+
+def drawWires(painter, lines):
+    '''
+    Draws plain wires from an int32 array of (x0, y0, x1, y1) rows, as WireStore keeps them.
+    '''
+    if len(lines) == 0:
+        return
+    # QPolygon is a packed array of int x, y pairs, so the rows can be copied
+    # straight into it and drawn as point pairs in one call
+    points = QPolygon(2 * len(lines))
+    buffer = points.data()
+    buffer.setsize(lines.nbytes)
+    np.frombuffer(buffer, dtype=np.int32)[:] = lines.ravel()
+
+    painter.setPen(QPen(Qt.black, 2, Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin))
+    painter.setOpacity(1.0)
+    painter.drawLines(points)
+
+def drawWireCursor(painter, mousePos):
+    size = 8
+    painter.setPen(QPen(Qt.black, 2, Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin))
+    painter.setOpacity(0.5)
+    painter.drawLine(mousePos + QPoint(-size, 0), mousePos + QPoint(size, 0))
+    painter.drawLine(mousePos + QPoint(0, -size), mousePos + QPoint(0, size))
 
 ###########################################################
 
-class Resistor(Component):
-    symbol = "R"
-    ports = {
-        "horizontal": [Port("p1", QPoint(-40,0), "east"), Port("p2", QPoint(40,0), "west")],
-        "vertical": [Port("p1", QPoint(0,-40), "south"), Port("p2", QPoint(0,40), "north")]
-    }
-    boundingBox = {
-        "horizontal": QRect(-42, -12, 84, 24),
-        "vertical": QRect(-12, -42, 24, 84),
-    }
-    textFields = {
-        "horizontal": [
-            TextField("resistance", QRect(-30, 12, 60, 20), Qt.AlignCenter, "{}Ω"),
-            TextField("id", QRect(-30, -30, 60, 20), Qt.AlignCenter, "{}")
-        ],
-        "vertical": [
-            TextField("resistance", QRect(15, -2, 60, 20), Qt.AlignLeft, "{}Ω"),
-            TextField("id", QRect(15, -18, 60, 20), Qt.AlignLeft, "{}")
-            ]
-    }
-    primaryField = "resistance"
-
-    def __init__(self, id, pos, r, resistance="1k"):
-        super().__init__(id, pos, r)
-        self.resistance = resistance
-
-    def draw(self, painter, is_ghost=False, is_hovered=False, is_selected=False, textHovered=None):
-        self._set_pen(painter, is_ghost, is_hovered, is_selected)
-
-        offsets = [(-40,0), (-30,0), (-25,-10), (-15,10), (-5,-10), (5,10), (15,-10), (25,10), (30,0), (40,0)]
-        if self.r == "north" or self.r == "south":
-            offsets = [(y, x) for x, y in offsets]
-    
-        points = [self.pos+QPoint(x,y) for x, y in offsets]
-        painter.drawPolyline(points)
-
-        self._drawTextFields(painter, is_ghost, textHovered)
-
-###########################################################
-
-class Capacitor(Component):
-    symbol = "C"
-    ports = {
-        "horizontal": [Port("p1", QPoint(-40,0), "east"), Port("p2", QPoint(40,0), "west")],
-        "vertical": [Port("p1", QPoint(0,-40), "south"), Port("p2", QPoint(0,40), "north")]
-    }
-    boundingBox = {
-        "horizontal": QRect(-42, -22, 84, 44),
-        "vertical": QRect(-22, -42, 44, 84),
-    }
-    textFields = {
-        "horizontal": [
-            TextField("capacitance", QRect(-30, 22, 60, 20), Qt.AlignCenter, "{}F"),
-            TextField("id", QRect(-30, -40, 60, 20), Qt.AlignCenter, "{}")
-        ],
-        "vertical": [
-            TextField("capacitance", QRect(24, -2, 60, 20), Qt.AlignLeft, "{}F"),
-            TextField("id", QRect(24, -18, 60, 20), Qt.AlignLeft, "{}")
-        ]
-    }
-    primaryField = "capacitance"
-
-    def __init__(self, id, pos, r, capacitance="1u"):
-        super().__init__(id, pos, r)
-        self.capacitance = capacitance
-
-    def draw(self, painter, is_ghost=False, is_hovered=False, is_selected=False, textHovered=None):
-        self._set_pen(painter, is_ghost, is_hovered, is_selected)
-
-        lines = [ [(-40,0), (-8,0)], [(-8,-20), (-8,20)], [(8,-20), (8,20)], [(8,0), (40,0)] ]
-        if self.r == "north" or self.r == "south":
-            lines = [[(y, x) for x, y in line] for line in lines]
-            
-        for line in lines:
-            points = [self.pos+QPoint(x,y) for x, y in line]
-            painter.drawPolyline(points)
-
-        self._drawTextFields(painter, is_ghost, textHovered)
+def symbolPath(cls, r):
+    path = _symbolCache.get((cls, r))
+    if path is None:
+        path = QPainterPath()
+        for line in getForDir(r, cls.shape):
+            path.moveTo(*line[0])
+            for x, y in line[1:]:
+                path.lineTo(x, y)
+        _symbolCache[(cls, r)] = path
+    return path
+
+def drawItem(painter, item, is_ghost=False, is_hovered=False, is_selected=False, textHovered=None, showText=True):
+    _set_pen(painter, is_ghost, is_hovered, is_selected)
+
+    x, y = item.pos
+    painter.translate(x, y)
+    painter.drawPath(symbolPath(type(item), item.r))
+    if showText:
+        _drawTextFields(painter, item, is_ghost, textHovered)
+    painter.translate(-x, -y)
+
+def drawItemOutline(painter, item, is_ghost=False, is_hovered=False, is_selected=False):
+    # stand-in for the symbol when it's too small to make out
+    _set_pen(painter, is_ghost, is_hovered, is_selected)
+    left, top, right, bottom = item.hitRect()
+    painter.drawRect(left, top, right - left, bottom - top)
+
+def _drawTextFields(painter, item, is_ghost=False, textHovered=None):
+    # expects the painter to already be translated to the item's pos
+    for textField in getForDir(item.r, item.textFields):
+        rect = _textRectCache.get(textField)
+        if rect is None:
+            rect = _textRectCache[textField] = toQRect(textField.rect)
+        painter.setOpacity(0.5 if textField.id == textHovered else 0.3 if (is_ghost and textField.id != item.primaryField) else 1.0)
+        painter.drawText(rect, _alignments[textField.align], textField.format.format(getattr(item, textField.id)))
 
 ###########################################################
 
-class VoltageSource(Component):
-    symbol = "V"
-    ports = {
-        "horizontal": [Port("p1", QPoint(-40,0), "east"), Port("p2", QPoint(40,0), "west")],
-        "vertical": [Port("p1", QPoint(0,-40), "south"), Port("p2", QPoint(0,40), "north")]
-    }
-    boundingBox = {
-        "horizontal": QRect(-42, -22, 84, 44),
-        "vertical": QRect(-22, -42, 44, 84),
-    }
-    textFields = {
-        "horizontal": [
-            TextField("voltage", QRect(-30, 22, 60, 20), Qt.AlignCenter, "{}V"),
-            TextField("id", QRect(-30, -40, 60, 20), Qt.AlignCenter, "{}")
-        ],
-        "vertical": [
-            TextField("voltage", QRect(24, -2, 60, 20), Qt.AlignLeft, "{}V"),
-            TextField("id", QRect(24, -18, 60, 20), Qt.AlignLeft, "{}")
-        ]
-    }
-    primaryField = "voltage"
-
-    def __init__(self, id, pos, r, voltage="5"):
-        super().__init__(id, pos, r)
-        self.voltage = voltage
-
-    def draw(self, painter, is_ghost=False, is_hovered=False, is_selected=False, textHovered=None):
-        self._set_pen(painter, is_ghost, is_hovered, is_selected)
-
-        # default is east
-        lines = [ [(-40,0), (-15,0)], [(-15,-12), (-15,12)], [(-5,-20), (-5,20)], [(5,-12), (5,12)], [(15,-20), (15,20)], [(15,0), (40,0)] ]
-
-        if self.r == "north":
-            lines = [[(-y, -x) for x, y in line] for line in lines]
-        elif self.r == "west":
-            lines = [[(-x, y) for x, y in line] for line in lines]
-        elif self.r == "south":
-            lines = [[(-y, x) for x, y in line] for line in lines]
-            
-        for line in lines:
-            points = [self.pos+QPoint(x,y) for x, y in line]
-            painter.drawPolyline(points)
-
-        self._drawTextFields(painter, is_ghost, textHovered)
-
-class Ground(Component):
-    symbol = "G"
-    ports = {
-        "west": [Port("p1", QPoint(0,0), "east")],
-        "north": [Port("p1", QPoint(0,0), "south")],
-        "east": [Port("p1", QPoint(0,0), "west")],
-        "south": [Port("p1", QPoint(0,0), "north")]
-    }
-    boundingBox = {
-        "west": QRect(-2, -22, 44, 44),
-        "north": QRect(-22, -2, 44, 44),
-        "east": QRect(-42, -22, 44, 44),
-        "south": QRect(-22, -42, 44, 44),
-    }
-    textFields = {
-        "all": [],
-    }
-
-    def draw(self, painter, is_ghost=False, is_hovered=False, is_selected=False, textHovered=None):
-        self._set_pen(painter, is_ghost, is_hovered, is_selected)
-
-        # default is east
-        lines = [[(-20, 0), (0,0)], [(-20, -15), (-20, 15)], [(-27, -10), (-27, 10)], [(-34, -5), (-34, 5)]]
-
-        if self.r == "north":
-            lines = [[(-y, -x) for x, y in line] for line in lines]
-        elif self.r == "west":
-            lines = [[(-x, y) for x, y in line] for line in lines]
-        elif self.r == "south":
-            lines = [[(-y, x) for x, y in line] for line in lines]
-            
-        for line in lines:
-            points = [self.pos+QPoint(x,y) for x, y in line]
-            painter.drawPolyline(points)
-
-        self._drawTextFields(painter, is_ghost, textHovered)
\ No newline at end of file
+def drawDrawable(painter, drawable, is_ghost=False, is_hovered=False, is_selected=False, textHovered=None, showText=True):
+    if isinstance(drawable, Wire):
+        drawWire(painter, drawable, is_ghost, is_hovered, is_selected)
+    else:
+        drawItem(painter, drawable, is_ghost, is_hovered, is_selected, textHovered, showText)
@@ -0,0 +1,227 @@
+'''
+Grades saved circuits against a reference answer without opening the editor.
+
+    python grade.py --reference answer.json submissions/
+
+The reference maps component ids to the expected DC values, e.g.
+{"R1": {"voltage": 2.5, "current": 0.0025}}. One JSON line per circuit is
+written to stdout as soon as it's graded.
+'''
+import argparse
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import sys
+import time
+from collections import deque
+
+from circuitFile import loadCircuit
+from mna import extractCircuit, solveDc
+
+# extra seconds the parent gives a worker before killing it, so SIGALRM gets
+# the first chance to stop a slow file without losing the process
+_killGrace = 1.0
+
+
+class _Timeout(Exception):
+    pass
+
+
+def _onAlarm(signum, frame):
+    raise _Timeout()
+
+
+def _compare(result, reference, relTol, absTol):
+    quantities = {"voltage": result.voltages, "current": result.currents}
+    mismatches = []
+    for id, expected in reference.items():
+        for quantity, want in expected.items():
+            got = quantities.get(quantity, {}).get(id)
+            if got is None:
+                mismatches.append({"id": id, "quantity": quantity, "expected": want, "got": None})
+            elif abs(got - want) > max(absTol, relTol * abs(want)):
+                mismatches.append({"id": id, "quantity": quantity, "expected": want, "got": got})
+    return mismatches
+
+
+def gradeFile(path, reference, relTol=1e-3, absTol=1e-9):
+    start = time.perf_counter()
+    try:
+        scene = loadCircuit(path)
+        result = solveDc(extractCircuit(scene))
+    except (OSError, ValueError) as e:
+        return {"file": path, "status": "error", "error": str(e), "seconds": time.perf_counter() - start}
+
+    mismatches = _compare(result, reference, relTol, absTol)
+    return {
+        "file": path,
+        "status": "fail" if mismatches else "pass",
+        "mismatches": mismatches,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def _gradeChunk(paths, reference, timeout, relTol, absTol):
+    # runs in a worker process, yielding one result per file. SIGALRM
+    # interrupts a file that takes too long in Python code, anything it can't
+    # interrupt is killed by the parent
+    canTimeout = timeout > 0 and hasattr(signal, "SIGALRM")
+    if canTimeout:
+        signal.signal(signal.SIGALRM, _onAlarm)
+
+    for path in paths:
+        try:
+            if canTimeout:
+                signal.setitimer(signal.ITIMER_REAL, timeout)
+            result = gradeFile(path, reference, relTol, absTol)
+        except _Timeout:
+            result = {"file": path, "status": "timeout", "seconds": timeout}
+        except Exception as e:
+            # a file that breaks the loader in some unexpected way still only fails itself
+            result = {"file": path, "status": "error", "error": repr(e)}
+        finally:
+            if canTimeout:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+        yield result
+
+
+def _work(conn, reference, timeout, relTol, absTol):
+    # worker process main loop, a chunk in and a result per file out until told to stop
+    while True:
+        chunk = conn.recv()
+        if chunk is None:
+            return
+        for result in _gradeChunk(chunk, reference, timeout, relTol, absTol):
+            conn.send(result)
+
+
+class _Worker():
+    '''
+    A grading process fed a chunk at a time over a pipe. It answers file by
+    file, so the parent always knows which file it's on and when it started.
+    '''
+
+    def __init__(self, args):
+        self.conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_work, args=(child,) + args, daemon=True)
+        self.process.start()
+        child.close()
+        # files sent but not answered yet, in order
+        self.pending = deque()
+        self.started = None
+
+    def send(self, chunk):
+        self.pending.extend(chunk)
+        self.conn.send(chunk)
+        self.started = time.monotonic()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        self.conn.send(None)
+        self.process.join()
+        self.conn.close()
+
+
+def _replace(workers, worker, queue, workerArgs):
+    # kills a worker and starts a fresh one in its place. The files it hadn't
+    # reached yet go back to the front of the queue, minus the one it was on.
+    worker.kill()
+    worker.pending.popleft()
+    if worker.pending:
+        queue.appendleft(list(worker.pending))
+    fresh = _Worker(workerArgs)
+    workers[workers.index(worker)] = fresh
+    return fresh
+
+
+def _collect(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith((".json", ".circ")):
+                    files.append(os.path.join(path, name))
+        else:
+            files.append(path)
+    return files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Grade saved circuits against a reference answer.")
+    parser.add_argument("circuits", nargs="+", help="circuit files, or directories of them")
+    parser.add_argument("--reference", required=True, help="JSON file of expected values per component id")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=8, help="circuits handed to a worker at a time")
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds allowed per circuit, 0 for none")
+    parser.add_argument("--rel-tol", type=float, default=1e-3)
+    parser.add_argument("--abs-tol", type=float, default=1e-9)
+    args = parser.parse_args(argv)
+
+    with open(args.reference, encoding="utf-8") as f:
+        reference = json.load(f)
+
+    files = _collect(args.circuits)
+    chunks = [files[i:i + args.chunk_size] for i in range(0, len(files), args.chunk_size)]
+
+    queue = deque(chunks)
+    workerArgs = (reference, args.timeout, args.rel_tol, args.abs_tol)
+    workers = [_Worker(workerArgs) for _ in range(min(args.jobs, len(chunks)))]
+    for worker in workers:
+        worker.send(queue.popleft())
+
+    allPassed = True
+    try:
+        while True:
+            busy = [worker for worker in workers if worker.pending]
+            if not busy:
+                break
+
+            wait = None
+            if args.timeout > 0:
+                deadline = min(worker.started for worker in busy) + args.timeout + _killGrace
+                wait = max(0.0, deadline - time.monotonic())
+            ready = multiprocessing.connection.wait([worker.conn for worker in busy], wait)
+
+            for worker in busy:
+                overdue = args.timeout > 0 and time.monotonic() - worker.started > args.timeout + _killGrace
+                if worker.conn in ready:
+                    try:
+                        result = worker.conn.recv()
+                    except (EOFError, OSError):
+                        # the worker died, e.g. killed or out of memory
+                        worker.process.join()
+                        result = {"file": worker.pending[0], "status": "error", "error": f"worker failed with exit code {worker.process.exitcode}"}
+                        worker = _replace(workers, worker, queue, workerArgs)
+                    else:
+                        worker.pending.popleft()
+                        worker.started = time.monotonic()
+                elif overdue:
+                    # stuck somewhere SIGALRM can't reach, or on a platform without it
+                    result = {"file": worker.pending[0], "status": "timeout", "seconds": args.timeout}
+                    worker = _replace(workers, worker, queue, workerArgs)
+                else:
+                    continue
+
+                allPassed = allPassed and result["status"] == "pass"
+                sys.stdout.write(json.dumps(result) + "\n")
+                sys.stdout.flush()
+                if not worker.pending and queue:
+                    worker.send(queue.popleft())
+    finally:
+        for worker in workers:
+            if worker.pending:
+                worker.kill()
+            else:
+                worker.stop()
+
+    return 0 if allPassed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+'''
+Undo/redo as a stack of commands that each hold only what they changed.
+
+Commands keep references to the same component and wire objects the scene
+holds rather than copies, so undoing a deletion puts the original object
+back. They don't touch the scene directly but go through a target with
+addItem, addWire, remove and setField, which lets the editor keep its
+journal and repaint in step.
+'''
+import collections
+
+from model import Wire
+
+# rough bytes per object, for keeping the history under its budget
+_itemCost = 400
+_wireCost = 250
+_fieldCost = 100
+
+
+class AddObjects():
+    def __init__(self, items=(), wires=()):
+        self.items = list(items)
+        self.wires = list(wires)
+        self.cost = _itemCost * len(self.items) + _wireCost * len(self.wires)
+
+    def apply(self, target):
+        for item in self.items:
+            target.addItem(item)
+        for wire in self.wires:
+            target.addWire(wire)
+
+    def revert(self, target):
+        for drawable in reversed(self.items + self.wires):
+            target.remove(drawable.id)
+
+
+class RemoveObjects():
+    def __init__(self, drawables):
+        self.drawables = list(drawables)
+        self.cost = sum(_wireCost if isinstance(d, Wire) else _itemCost for d in self.drawables)
+
+    def apply(self, target):
+        for drawable in self.drawables:
+            target.remove(drawable.id)
+
+    def revert(self, target):
+        for drawable in reversed(self.drawables):
+            if isinstance(drawable, Wire):
+                target.addWire(drawable)
+            else:
+                target.addItem(drawable)
+
+
+class SetField():
+    def __init__(self, item, field, old, new):
+        self.item = item
+        self.field = field
+        self.old = old
+        self.new = new
+        self.cost = _fieldCost + len(old) + len(new)
+
+    def apply(self, target):
+        target.setField(self.item, self.field, self.new)
+
+    def revert(self, target):
+        target.setField(self.item, self.field, self.old)
+
+
+class History():
+    '''
+    Undo and redo stacks of commands. Once the commands on them add up to
+    more than budget bytes, the oldest undo steps are dropped.
+    '''
+
+    def __init__(self, budget=16 * 1024 * 1024):
+        self.budget = budget
+        self.undoStack = collections.deque()
+        self.redoStack = []
+        self.cost = 0
+
+    def do(self, command, target):
+        '''
+        Applies the command and makes it the next thing to undo.
+        '''
+        command.apply(target)
+        self.push(command)
+
+    def push(self, command):
+        '''
+        Records a command that has already been applied.
+        '''
+        for dropped in self.redoStack:
+            self.cost -= dropped.cost
+        self.redoStack = []
+        self.undoStack.append(command)
+        self.cost += command.cost
+        while self.cost > self.budget and len(self.undoStack) > 1:
+            self.cost -= self.undoStack.popleft().cost
+
+    def canUndo(self):
+        return len(self.undoStack) > 0
+
+    def canRedo(self):
+        return len(self.redoStack) > 0
+
+    def undo(self, target):
+        if not self.undoStack:
+            return False
+        command = self.undoStack.pop()
+        command.revert(target)
+        self.redoStack.append(command)
+        return True
+
+    def redo(self, target):
+        if not self.redoStack:
+            return False
+        command = self.redoStack.pop()
+        command.apply(target)
+        self.undoStack.append(command)
+        return True
+
+    def clear(self):
+        self.undoStack.clear()
+        self.redoStack = []
+        self.cost = 0
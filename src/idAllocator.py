@@ -0,0 +1,74 @@
+import heapq
+import re
+
+
+class IdAllocator():
+    '''
+    Tracks which ids of the form prefix + number are taken and hands out the
+    smallest free number for a prefix, same as counting up from 1 would.
+    Numbers below the counter that get released go on a min-heap so they
+    are reused first.
+    '''
+    idPattern = re.compile(r"^(.*?)([1-9][0-9]*)$")
+
+    def __init__(self):
+        self.used = {}
+        self.freed = {}
+        self.nextFree = {}
+
+    def _split(self, id):
+        match = self.idPattern.match(id)
+        if match is None:
+            return None
+        return match.group(1), int(match.group(2))
+
+    def inUse(self, id):
+        parts = self._split(id)
+        if parts is None:
+            return False
+        prefix, num = parts
+        return num in self.used.get(prefix, ())
+
+    def reserve(self, id):
+        parts = self._split(id)
+        if parts is None:
+            # can't clash with anything we hand out
+            return
+        prefix, num = parts
+        self.used.setdefault(prefix, set()).add(num)
+
+    def release(self, id):
+        parts = self._split(id)
+        if parts is None:
+            return
+        prefix, num = parts
+        used = self.used.get(prefix)
+        if used is None or num not in used:
+            return
+        used.discard(num)
+        if num < self.nextFree.get(prefix, 1):
+            heapq.heappush(self.freed.setdefault(prefix, []), num)
+
+    def peek(self, prefix):
+        '''
+        Returns the id allocate() would hand out next, without taking it.
+        '''
+        used = self.used.setdefault(prefix, set())
+        freed = self.freed.setdefault(prefix, [])
+
+        # drop numbers that were released and then taken again by reserve()
+        while freed and freed[0] in used:
+            heapq.heappop(freed)
+        if freed:
+            return f"{prefix}{freed[0]}"
+
+        num = self.nextFree.get(prefix, 1)
+        while num in used:
+            num += 1
+        self.nextFree[prefix] = num
+        return f"{prefix}{num}"
+
+    def allocate(self, prefix):
+        id = self.peek(prefix)
+        self.reserve(id)
+        return id
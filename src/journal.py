@@ -0,0 +1,285 @@
+'''
+Autosave as an append-only journal of edits on top of a snapshot.
+
+Everything lives in one directory:
+
+    snapshot.<gen>.circ (or .json)   the circuit before journal <gen>
+    journal.<gen>                    one JSON line per edit made after it
+
+Only one editor may use a directory at a time. lockedJournal() takes a
+lock next to it, and an editor that finds it held moves on to the next of
+directory.2, directory.3 and so on. An autosave in a directory nobody holds
+was left by an editor that's gone, so it's safe to recover.
+
+Recovery loads the newest snapshot and replays every journal from its
+generation on. Compaction starts a fresh journal, then folds the snapshot
+and the journals before it into the next snapshot on a background thread.
+The new snapshot is renamed into place before anything older is deleted, so
+a crash at any point still leaves a snapshot and the journals after it.
+'''
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+from circuitFile import componentToDict, componentFromDict, wireToDict, wireFromDict, loadCircuit
+from circuitBinary import saveBinary
+
+_snapshotPattern = re.compile(r"^snapshot\.(\d+)\.(circ|json)$")
+_journalPattern = re.compile(r"^journal\.(\d+)$")
+
+
+def applyRecord(scene, record):
+    '''
+    Replays one journal record onto the scene. Raises ValueError if it doesn't apply.
+    '''
+    try:
+        op = record["op"]
+        if op == "place":
+            scene.addItem(componentFromDict(record["item"]))
+        elif op == "wire":
+            scene.addWire(wireFromDict(record["wire"]))
+        elif op == "remove":
+            scene.remove(record["id"])
+        elif op == "field":
+            item = scene.items[record["id"]]
+            scene.setField(item, record["field"], record["value"])
+        else:
+            raise ValueError(f"Unknown journal op {op!r}")
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Malformed journal record: {e!r}")
+
+
+def replay(scene, path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # a crash mid-write leaves a torn last line, everything before it is good
+                break
+            applyRecord(scene, record)
+
+
+def _lock(path):
+    # returns the open lock file, or None if another process holds it. The OS
+    # drops the lock when its holder exits, so a crash can't leave it stuck.
+    f = open(path, "a+b")
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def lockedJournal(directory, slots=16, compactEvery=1000):
+    '''
+    Returns a Journal in the first of directory, directory.2, directory.3, ...
+    that no other running editor holds, or None if every one of them is taken.
+    The lock is held until the journal is released or the process exits.
+    '''
+    for slot in range(1, slots + 1):
+        path = directory if slot == 1 else f"{directory}.{slot}"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        lockFile = _lock(f"{path}.lock")
+        if lockFile is not None:
+            journal = Journal(path, compactEvery)
+            journal.lockFile = lockFile
+            return journal
+    return None
+
+
+class Journal():
+    '''
+    Appends each edit to the current journal file, so an autosave costs one
+    short write no matter how big the circuit is. After compactEvery records
+    the journal is compacted in the background.
+    '''
+
+    def __init__(self, directory, compactEvery=1000):
+        self.directory = directory
+        self.compactEvery = compactEvery
+        os.makedirs(directory, exist_ok=True)
+
+        self.gen = 0
+        self.file = None
+        self.records = 0
+        self.compaction = None
+        # set by lockedJournal()
+        self.lockFile = None
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _scan(self):
+        # (snapshot gen -> file name, sorted journal gens)
+        snapshots, journals = {}, []
+        for name in os.listdir(self.directory):
+            match = _snapshotPattern.match(name)
+            if match is not None:
+                snapshots[int(match.group(1))] = name
+            match = _journalPattern.match(name)
+            if match is not None:
+                journals.append(int(match.group(1)))
+        return snapshots, sorted(journals)
+
+    def _openJournal(self, gen):
+        if self.file is not None:
+            self.file.close()
+        self.gen = gen
+        self.file = open(self._path(f"journal.{gen}"), "a", encoding="utf-8")
+        self.records = 0
+
+    def recover(self):
+        '''
+        Rebuilds the autosaved circuit and carries on journaling after it.
+        Returns None if there's nothing to recover, raises ValueError if
+        there is but it can't be restored.
+        '''
+        snapshots, journals = self._scan()
+        if not snapshots:
+            return None
+        gen = max(snapshots)
+        try:
+            scene = loadCircuit(self._path(snapshots[gen]))
+            for journalGen in journals:
+                if journalGen >= gen:
+                    replay(scene, self._path(f"journal.{journalGen}"))
+        except Exception as e:
+            # whatever is wrong with the files, it'll be wrong on every launch
+            raise ValueError(f"Autosave can't be restored: {e}")
+
+        self._openJournal(max(journals + [gen]) + 1)
+        self.compact()
+        return scene
+
+    def setAside(self):
+        '''
+        Moves the whole autosave directory out of the way, leaving an empty
+        one behind, and returns where it went.
+        '''
+        self.close()
+        aside = f"{self.directory}.broken-{time.strftime('%Y%m%d-%H%M%S')}"
+        os.replace(self.directory, aside)
+        os.makedirs(self.directory, exist_ok=True)
+        self.gen = 0
+        return aside
+
+    def start(self, scene):
+        '''
+        Starts over from a full snapshot of the scene.
+        '''
+        gen = self._restart()
+        saveBinary(scene, self._path(f"snapshot.{gen}.circ"))
+        self._afterRestart(gen)
+
+    def startFrom(self, path):
+        '''
+        Starts over from a saved circuit file, which is copied rather than decoded.
+        '''
+        gen = self._restart()
+        extension = "json" if path.lower().endswith(".json") else "circ"
+        shutil.copyfile(path, self._path(f"snapshot.{gen}.{extension}.tmp"))
+        os.replace(self._path(f"snapshot.{gen}.{extension}.tmp"), self._path(f"snapshot.{gen}.{extension}"))
+        self._afterRestart(gen)
+
+    def _restart(self):
+        self.wait()
+        snapshots, journals = self._scan()
+        return max(list(snapshots) + journals + [self.gen]) + 1
+
+    def _afterRestart(self, gen):
+        self._openJournal(gen)
+        # the new snapshot is in place, so everything before it can go
+        self._cleanUp(gen)
+
+    def _cleanUp(self, gen):
+        snapshots, journals = self._scan()
+        for snapshotGen, name in snapshots.items():
+            if snapshotGen < gen:
+                os.remove(self._path(name))
+        for journalGen in journals:
+            if journalGen < gen:
+                os.remove(self._path(f"journal.{journalGen}"))
+
+    def record(self, record):
+        if self.file is None:
+            return
+        # flushed to the OS straight away so a crash of the editor loses nothing,
+        # without paying for an fsync on every edit
+        self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.file.flush()
+        self.records += 1
+        if self.records >= self.compactEvery:
+            self.compact()
+
+    def place(self, item):
+        self.record({"op": "place", "item": componentToDict(item)})
+
+    def wire(self, wire):
+        self.record({"op": "wire", "wire": wireToDict(wire)})
+
+    def remove(self, id):
+        self.record({"op": "remove", "id": id})
+
+    def field(self, id, field, value):
+        self.record({"op": "field", "id": id, "field": field, "value": value})
+
+    def compact(self):
+        '''
+        Moves on to a new journal and folds the old ones into a snapshot in the background.
+        Does nothing if a compaction is already running.
+        '''
+        if self.file is None or (self.compaction is not None and self.compaction.is_alive()):
+            return
+        upTo = self.gen
+        self._openJournal(upTo + 1)
+        self.compaction = threading.Thread(target=self._compact, args=(upTo,), daemon=True)
+        self.compaction.start()
+
+    def _compact(self, upTo):
+        snapshots, journals = self._scan()
+        gen = max(gen for gen in snapshots if gen <= upTo)
+        scene = loadCircuit(self._path(snapshots[gen]))
+        for journalGen in journals:
+            if gen <= journalGen <= upTo:
+                replay(scene, self._path(f"journal.{journalGen}"))
+
+        temp = self._path(f"snapshot.{upTo + 1}.circ.tmp")
+        saveBinary(scene, temp)
+        os.replace(temp, self._path(f"snapshot.{upTo + 1}.circ"))
+        self._cleanUp(upTo + 1)
+
+    def wait(self):
+        if self.compaction is not None:
+            self.compaction.join()
+            self.compaction = None
+
+    def close(self):
+        self.wait()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def release(self):
+        '''
+        Closes the journal and lets another editor have its directory.
+        '''
+        self.close()
+        if self.lockFile is not None:
+            self.lockFile.close()
+            self.lockFile = None
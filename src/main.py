@@ -1,5 +1,7 @@
+import os
 import sys
 from PyQt5.QtWidgets import QApplication, QWidget, QHBoxLayout
+from PyQt5.QtCore import QStandardPaths
 from PyQt5 import QtGui, QtCore
 
 from circuitEditor import CircuitEditor
@@ -30,6 +32,8 @@ class MyWindow(QWidget):
         self.setLayout(layout)
 
         self.circuit_drawer = CircuitEditor()
+        autosaveDir = os.path.join(QStandardPaths.writableLocation(QStandardPaths.AppDataLocation), "autosave")
+        self.circuit_drawer.startAutosave(autosaveDir)
         self.sidebar = Sidebar()
 
         layout.addWidget(self.circuit_drawer)
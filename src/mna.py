@@ -0,0 +1,473 @@
+from collections import namedtuple
+
+import numpy as np
+import scipy.sparse
+import scipy.sparse.linalg
+
+from values import valuesOf
+
+# kind is the component symbol. nodes are net ids, ordered (p1, p2), or
+# (positive, negative) for voltage sources. value is the parsed primary
+# field, None for components that don't have one.
+Element = namedtuple("Element", ["kind", "id", "nodes", "value"])
+
+# conductance from every node to ground, keeps floating nets solvable
+GMIN = 1e-12
+
+
+def extractCircuit(scene):
+    '''
+    Returns the elements of everything placed in the scene, with each port
+    replaced by the id of the net it's connected to. Raises ValueError if a
+    component's value doesn't parse.
+    '''
+    items = list(scene.items.values())
+    # values are parsed a symbol at a time, straight into arrays
+    values = {}
+    for kind in dict.fromkeys(item.symbol for item in items if item.primaryField != ""):
+        ofKind = [item for item in items if item.symbol == kind]
+        values.update(zip(ofKind, valuesOf(ofKind, kind).tolist()))
+
+    elements = []
+    for item in items:
+        ports = {port.name: scene.netlist.netOf(port.pos) for port in scene.portIndex.owners[item]}
+        if item.symbol == "V":
+            positive = item.positivePort[item.r]
+            negative = "p2" if positive == "p1" else "p1"
+            nodes = (ports[positive], ports[negative])
+        else:
+            nodes = tuple(ports[name] for name in sorted(ports))
+        elements.append(Element(item.symbol, item.id, nodes, values.get(item)))
+    return elements
+
+
+class DcResult():
+    def __init__(self, nodeVoltages, voltages, currents):
+        # net id -> volts
+        self.nodeVoltages = nodeVoltages
+        # element id -> volts across it, first node minus second
+        self.voltages = voltages
+        # element id -> amps through it, from its first node to its second
+        self.currents = currents
+
+
+def _nodeNumbering(elements):
+    ground = set()
+    for element in elements:
+        if element.kind == "G":
+            ground.add(element.nodes[0])
+    if not ground:
+        raise ValueError("Circuit has no ground.")
+
+    index = {}
+    for element in elements:
+        for node in element.nodes:
+            if node not in ground and node not in index:
+                index[node] = len(index)
+    return ground, index
+
+
+def _stamp(rows, cols, vals, r, c, v):
+    # entries touching ground (-1) aren't part of the system
+    keep = (r >= 0) & (c >= 0)
+    rows.append(r[keep])
+    cols.append(c[keep])
+    vals.append(v[keep])
+
+
+def _stampConductances(rows, cols, vals, a, b, g):
+    # a, b are node numbers and g the conductances between them
+    for r, c, v in [(a, a, g), (b, b, g), (a, b, -g), (b, a, -g)]:
+        _stamp(rows, cols, vals, r, c, v)
+
+
+class SweepResult():
+    def __init__(self, id, values, nodeVoltages, voltages, currents):
+        # the swept element and the values it took
+        self.id = id
+        self.values = values
+        # same as DcResult, but each entry is an array over the sweep
+        self.nodeVoltages = nodeVoltages
+        self.voltages = voltages
+        self.currents = currents
+
+
+class _System():
+    '''
+    The MNA system of a circuit: matrix entries as coordinate arrays, the
+    right-hand side, and how nets and elements map onto its rows.
+    '''
+
+    def __init__(self, elements):
+        self.elements = elements
+        self.ground, self.index = _nodeNumbering(elements)
+        self.resistors = [element for element in elements if element.kind == "R"]
+        self.sources = [element for element in elements if element.kind == "V"]
+        n, m = self.n, self.m = len(self.index), len(self.sources)
+
+        resistance = np.array([e.value for e in self.resistors], dtype=float)
+        if np.any(resistance == 0):
+            raise ValueError(f"{self.resistors[int(np.argmax(resistance == 0))].id} has zero resistance.")
+
+        diagonal = np.arange(n)
+        rows, cols, vals = [diagonal], [diagonal], [np.full(n, GMIN)]
+        _stampConductances(rows, cols, vals, self.nodes(self.resistors, 0), self.nodes(self.resistors, 1), 1 / resistance)
+
+        # each source adds a row for its voltage and a column for its current
+        branch = n + np.arange(m)
+        ones = np.ones(m)
+        pos, neg = self.nodes(self.sources, 0), self.nodes(self.sources, 1)
+        for r, c, v in [(pos, branch, ones), (neg, branch, -ones), (branch, pos, ones), (branch, neg, -ones)]:
+            _stamp(rows, cols, vals, r, c, v)
+        self.rows, self.cols, self.vals = np.concatenate(rows), np.concatenate(cols), np.concatenate(vals)
+
+        self.rhs = np.zeros(n + m)
+        self.rhs[n:] = [source.value for source in self.sources]
+
+        # for reading results: each element's terminals, and which of them are resistors
+        self.resistance = resistance
+        self.terminals = [element for element in elements if element.kind != "G"]
+        self.first, self.second = self.nodes(self.terminals, 0), self.nodes(self.terminals, 1)
+        self.resistorColumns = np.array([j for j, element in enumerate(self.terminals) if element.kind == "R"], dtype=int)
+        self.nets = list(self.index)
+        self.ids = [[element.id for element in group] for group in (self.terminals, self.resistors, self.sources)]
+
+    def nodes(self, group, which):
+        # node numbers of one terminal of each element, ground is -1
+        return np.array([-1 if e.nodes[which] in self.ground else self.index[e.nodes[which]] for e in group], dtype=int)
+
+    def matrix(self):
+        size = self.n + self.m
+        return scipy.sparse.csc_matrix((self.vals, (self.rows, self.cols)), shape=(size, size))
+
+    def results(self, x, values={}):
+        '''
+        Reads node voltages, element voltages and currents out of a solution.
+        x may have leading batch dimensions, the values then come out as arrays
+        over them. values overrides resistances by id.
+        '''
+        batch = x.shape[:-1]
+
+        def byId(ids, columns):
+            if batch:
+                return {id: columns[..., j] for j, id in enumerate(ids)}
+            return dict(zip(ids, columns.tolist()))
+
+        # ground goes on the end, so node number -1 picks it
+        nodes = np.concatenate([x[..., :self.n], np.zeros(batch + (1,))], axis=-1)
+        zero = np.zeros(batch) if batch else 0.0
+        nodeVoltages = {net: zero for net in self.ground}
+        nodeVoltages.update(byId(self.nets, nodes[..., :-1]))
+
+        v = nodes[..., self.first] - nodes[..., self.second]
+        terminalIds, resistorIds, sourceIds = self.ids
+        voltages = byId(terminalIds, v)
+
+        resistance = self.resistance
+        if values:
+            resistance = np.broadcast_to(resistance, batch + resistance.shape).copy()
+            for j, element in enumerate(self.resistors):
+                if element.id in values:
+                    resistance[..., j] = values[element.id]
+        currents = {element.id: zero for element in self.terminals if element.kind == "C"}
+        currents.update(byId(resistorIds, v[..., self.resistorColumns] / resistance))
+        currents.update(byId(sourceIds, x[..., self.n:]))
+        return nodeVoltages, voltages, currents
+
+
+def solveDc(elements):
+    '''
+    Finds the DC operating point with modified nodal analysis. Capacitors are
+    treated as open circuits. Raises ValueError if the circuit can't be solved.
+    '''
+    system = _System(elements)
+    try:
+        x = scipy.sparse.linalg.splu(system.matrix()).solve(system.rhs)
+    except RuntimeError:
+        raise ValueError("Circuit can't be solved, check for shorted or looped voltage sources.")
+    return DcResult(*system.results(x))
+
+
+class DcSolver():
+    '''
+    Solves the same circuit over and over as its values are edited. The LU
+    factorization is kept between solves and, as long as the topology stays
+    the same, changed resistors are folded in as a low-rank (Woodbury)
+    correction and changed sources are just a new right-hand side. After
+    more than maxUpdates resistors differ from the factorized ones it
+    factorizes again.
+    '''
+
+    def __init__(self, maxUpdates=16):
+        self.maxUpdates = maxUpdates
+        self.topology = None
+        self.system = None
+        self.lu = None
+        # resistor id -> (its stamp vector, the factorization solved against it)
+        self.columns = {}
+        self.factorizations = 0
+
+    def _factorize(self, elements, topology):
+        self.topology = None
+        self.system = _System(elements)
+        try:
+            self.lu = scipy.sparse.linalg.splu(self.system.matrix())
+        except RuntimeError:
+            raise ValueError("Circuit can't be solved, check for shorted or looped voltage sources.")
+        self.topology = topology
+        self.factorized = {element.id: element.value for element in self.system.resistors}
+        self.columns = {}
+        self.factorizations += 1
+
+    def _column(self, resistor):
+        column = self.columns.get(resistor.id)
+        if column is None:
+            system = self.system
+            u = np.zeros(system.n + system.m)
+            for which, sign in [(0, 1), (1, -1)]:
+                node = system.nodes([resistor], which)[0]
+                if node >= 0:
+                    u[node] = sign
+            column = self.columns[resistor.id] = (u, self.lu.solve(u))
+        return column
+
+    def solve(self, elements):
+        '''
+        Same as solveDc(elements), reusing whatever it can from the last solve.
+        '''
+        topology = [(element.kind, element.id, element.nodes) for element in elements]
+        if topology != self.topology:
+            self._factorize(elements, topology)
+
+        system, factorized = self.system, self.factorized
+        changed = [element for element in elements if element.kind == "R" and element.value != factorized[element.id]]
+        for element in changed:
+            if element.value == 0:
+                raise ValueError(f"{element.id} has zero resistance.")
+        if len(changed) > self.maxUpdates:
+            self._factorize(elements, topology)
+            return DcResult(*self.system.results(self.lu.solve(self.system.rhs)))
+
+        rhs = system.rhs.copy()
+        rhs[system.n:] = [element.value for element in elements if element.kind == "V"]
+        x = self.lu.solve(rhs)
+        if changed:
+            # (A + U D U^T)^-1 b, with A^-1 U cached per resistor
+            u, z = (np.column_stack(c) for c in zip(*map(self._column, changed)))
+            dg = np.array([1 / element.value - 1 / factorized[element.id] for element in changed])
+            try:
+                x -= z @ np.linalg.solve(np.diag(1 / dg) + u.T @ z, u.T @ x)
+            except np.linalg.LinAlgError:
+                self._factorize(elements, topology)
+                return DcResult(*self.system.results(self.lu.solve(self.system.rhs)))
+        return DcResult(*system.results(x, {element.id: element.value for element in changed}))
+
+
+def sweepDc(elements, id, values, maxBytes=64 * 1024 * 1024):
+    '''
+    Solves the DC operating point for each value of the element with the
+    given id. All points are solved by batched dense solves over a stack of
+    MNA matrices, split into as few stacks as fit in maxBytes. Raises
+    ValueError if the element can't be swept or a point can't be solved.
+    '''
+    values = np.asarray(values, dtype=float)
+    swept = next((element for element in elements if element.id == id), None)
+    if swept is None:
+        raise ValueError(f"There's no {id} to sweep.")
+    if swept.value is None:
+        raise ValueError(f"{id} has no value to sweep.")
+    if swept.kind == "R" and np.any(values == 0):
+        raise ValueError(f"{id} can't be swept through zero resistance.")
+
+    system = _System(elements)
+    n, size = system.n, system.n + system.m
+    if size * size * 8 > maxBytes:
+        raise ValueError(f"Circuit is too big to sweep in {maxBytes} bytes.")
+    base = np.zeros((size, size))
+    np.add.at(base, (system.rows, system.cols), system.vals)
+    rhs = np.broadcast_to(system.rhs, (len(values), size)).copy()
+
+    # (row, col, sign) of the swept resistor's conductance in the matrix
+    stamp = None
+    if swept.kind == "R":
+        a, b = (system.nodes([swept], which)[0] for which in (0, 1))
+        stamp = [(r, c, v) for r, c, v in [(a, a, 1), (b, b, 1), (a, b, -1), (b, a, -1)] if r >= 0 and c >= 0]
+        for r, c, v in stamp:
+            base[r, c] -= v / swept.value
+    elif swept.kind == "V":
+        rhs[:, n + system.sources.index(swept)] = values
+    # capacitors are open at DC, so sweeping one changes nothing
+
+    if size == 0:
+        # everything is on ground
+        x = np.zeros((len(values), 0))
+    else:
+        try:
+            if not stamp:
+                # one matrix, every point is just another right-hand side
+                x = np.linalg.solve(base, rhs.T).T
+            else:
+                x = np.empty((len(values), size))
+                chunk = maxBytes // (size * size * 8)
+                for start in range(0, len(values), chunk):
+                    g = 1 / values[start:start + chunk]
+                    stack = np.repeat(base[None], len(g), axis=0)
+                    for r, c, v in stamp:
+                        stack[:, r, c] += v * g
+                    x[start:start + chunk] = np.linalg.solve(stack, rhs[start:start + chunk, :, None])[..., 0]
+        except np.linalg.LinAlgError:
+            raise ValueError("Circuit can't be solved, check for shorted or looped voltage sources.")
+
+    return SweepResult(id, values, *system.results(x, {id: values}))
+
+
+class TransientChunk():
+    def __init__(self, times, nodeVoltages, voltages, currents):
+        # seconds, one per sample
+        self.times = times
+        # same as DcResult, but each entry is an array over times
+        self.nodeVoltages = nodeVoltages
+        self.voltages = voltages
+        self.currents = currents
+
+
+def transient(elements, step, duration, method="trapezoidal", chunkSteps=1024):
+    '''
+    Simulates the circuit from t = 0, with every capacitor uncharged and the
+    sources switched on at t = 0, in fixed steps up to duration (seconds).
+    Capacitors are replaced by backward-Euler ("backwardEuler") or
+    trapezoidal companion models, so every step is a solve against one
+    factorization. Returns a generator of TransientChunks of up to
+    chunkSteps samples each, starting with t = 0, so long runs don't have
+    to fit in memory. Raises ValueError if the circuit can't be simulated.
+    '''
+    if step <= 0 or duration <= 0:
+        raise ValueError("Step and duration have to be positive.")
+    if method not in ("backwardEuler", "trapezoidal"):
+        raise ValueError(f"Unknown integration method {method!r}")
+
+    system = _System(elements)
+    n, size = system.n, system.n + system.m
+    capacitors = [element for element in elements if element.kind == "C"]
+    capacitance = np.array([element.value for element in capacitors], dtype=float)
+    if np.any(capacitance < 0):
+        raise ValueError(f"{capacitors[int(np.argmax(capacitance < 0))].id} has negative capacitance.")
+
+    # the starting state has every capacitor shorted, as 0 V sources, which
+    # also gives the currents they start charging with
+    shorted = _System([element._replace(kind="V", value=0.0) if element.kind == "C" else element for element in elements])
+    try:
+        x0 = scipy.sparse.linalg.splu(shorted.matrix()).solve(shorted.rhs)
+    except RuntimeError:
+        raise ValueError("Circuit can't be simulated, check for capacitors looped with voltage sources.")
+    branch = {source.id: shorted.n + k for k, source in enumerate(shorted.sources)}
+    x = np.zeros(size)
+    x[:n] = x0[:n]
+    x[n:] = x0[[branch[source.id] for source in system.sources]]
+    current = x0[[branch[capacitor.id] for capacitor in capacitors]]
+
+    # companion conductances go into the matrix, their history currents into the rhs
+    trapezoidal = method == "trapezoidal"
+    g = (2 if trapezoidal else 1) * capacitance / step
+    first, second = system.nodes(capacitors, 0), system.nodes(capacitors, 1)
+    rows, cols, vals = [system.rows], [system.cols], [system.vals]
+    _stampConductances(rows, cols, vals, first, second, g)
+    matrix = scipy.sparse.csc_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))), shape=(size, size))
+    try:
+        lu = scipy.sparse.linalg.splu(matrix)
+    except RuntimeError:
+        raise ValueError("Circuit can't be solved, check for shorted or looped voltage sources.")
+
+    # capacitor voltages are incidence @ x
+    keep = [(first >= 0, first, 1.0), (second >= 0, second, -1.0)]
+    incidence = scipy.sparse.csr_matrix(
+        (np.concatenate([np.full(np.count_nonzero(mask), v) for mask, _, v in keep]),
+         (np.concatenate([np.flatnonzero(mask) for mask, _, _ in keep]), np.concatenate([nodes[mask] for mask, nodes, _ in keep]))),
+        shape=(len(capacitors), size))
+    scatter = incidence.T.tocsr()
+
+    return _transientSteps(system, capacitors, lu, incidence, scatter, g, trapezoidal, x, current,
+                           step, int(round(duration / step)) + 1, chunkSteps)
+
+
+def _transientSteps(system, capacitors, lu, incidence, scatter, g, trapezoidal, x, current, step, samples, chunkSteps):
+    voltage = incidence @ x
+    done = 0
+    while done < samples:
+        count = min(chunkSteps, samples - done)
+        xs = np.empty((count, len(x)))
+        currents = np.empty((count, len(capacitors)))
+        for j in range(count):
+            if done + j > 0:
+                history = g * voltage + current if trapezoidal else g * voltage
+                x = lu.solve(system.rhs + scatter @ history)
+                newVoltage = incidence @ x
+                current = g * (newVoltage - voltage) - (current if trapezoidal else 0)
+                voltage = newVoltage
+            xs[j] = x
+            currents[j] = current
+
+        nodeVoltages, voltages, elementCurrents = system.results(xs)
+        for k, capacitor in enumerate(capacitors):
+            elementCurrents[capacitor.id] = currents[:, k]
+        yield TransientChunk((done + np.arange(count)) * step, nodeVoltages, voltages, elementCurrents)
+        done += count
+
+
+class AcResult():
+    def __init__(self, frequencies, nodeVoltages, voltages, currents):
+        # hertz
+        self.frequencies = frequencies
+        # same as DcResult, but each entry is a complex phasor array over frequencies
+        self.nodeVoltages = nodeVoltages
+        self.voltages = voltages
+        self.currents = currents
+
+
+def acSweep(elements, source, frequencies, maxBytes=64 * 1024 * 1024):
+    '''
+    Small-signal response at each of the given frequencies (Hz) to a 1 V AC
+    signal from the voltage source with id source. The other sources are
+    shorted. The admittance matrix is split into G + jωC once and every
+    frequency is solved by batched dense complex solves, split into as few
+    stacks as fit in maxBytes. With a 1 V input the phasors read directly as
+    transfer functions. Raises ValueError if the circuit can't be solved.
+    '''
+    frequencies = np.asarray(frequencies, dtype=float)
+    system = _System(elements)
+    n, size = system.n, system.n + system.m
+    k = next((k for k, element in enumerate(system.sources) if element.id == source), None)
+    if k is None:
+        raise ValueError(f"There's no voltage source {source}.")
+
+    conductance = np.zeros((size, size))
+    np.add.at(conductance, (system.rows, system.cols), system.vals)
+    capacitors = [element for element in elements if element.kind == "C"]
+    capacitance = np.array([element.value for element in capacitors], dtype=float)
+    first, second = system.nodes(capacitors, 0), system.nodes(capacitors, 1)
+    rows, cols, vals = [], [], []
+    _stampConductances(rows, cols, vals, first, second, capacitance)
+    susceptance = np.zeros((size, size))
+    if capacitors:
+        np.add.at(susceptance, (np.concatenate(rows), np.concatenate(cols)), np.concatenate(vals))
+
+    rhs = np.zeros(size, dtype=complex)
+    rhs[n + k] = 1
+    if size * size * 16 > maxBytes:
+        raise ValueError(f"Circuit is too big to sweep in {maxBytes} bytes.")
+    x = np.empty((len(frequencies), size), dtype=complex)
+    # never empty, the source has a row
+    chunk = maxBytes // (size * size * 16)
+    try:
+        for start in range(0, len(frequencies), chunk):
+            omega = 2 * np.pi * frequencies[start:start + chunk]
+            stack = conductance + 1j * omega[:, None, None] * susceptance
+            x[start:start + chunk] = np.linalg.solve(stack, np.broadcast_to(rhs[:, None], (len(omega), size, 1)))[..., 0]
+    except np.linalg.LinAlgError:
+        raise ValueError("Circuit can't be solved, check for shorted or looped voltage sources.")
+
+    nodeVoltages, voltages, currents = system.results(x)
+    omega = 2 * np.pi * frequencies
+    for capacitor, c in zip(capacitors, capacitance):
+        currents[capacitor.id] = 1j * omega * c * voltages[capacitor.id]
+    return AcResult(frequencies, nodeVoltages, voltages, currents)
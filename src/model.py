@@ -0,0 +1,352 @@
+'''
+The circuit model: components, wires and their geometry, with no Qt in
+sight so it can be used headless and pickled cheaply. drawable.py draws it.
+'''
+from values import parseValue
+
+
+def nextDirection(r):
+    dirs = {"west": "north", "north": "east", "east": "south", "south": "west"}
+    return dirs[r]
+
+def fallBackDirection(r, available):
+    # todo: Refactor LMAO
+    fallbacks = {
+        "west": ["west", "horizontal", "all"],
+        "north": ["north", "vertical", "all"],
+        "east": ["east", "horizontal", "all"],
+        "south": ["south", "vertical", "all"]
+    }
+    for f in fallbacks[r]:
+        if f in available:
+            return f
+    raise ValueError(f"No fallback direction available for {r}. This should never happen.")
+
+def getForDir(r, mapping):
+    theDir = fallBackDirection(r, mapping.keys())
+    return mapping[theDir]
+
+def orientLines(lines, r):
+    # lines are given facing east
+    if r == "north":
+        return [[(-y, -x) for x, y in line] for line in lines]
+    elif r == "west":
+        return [[(-x, y) for x, y in line] for line in lines]
+    elif r == "south":
+        return [[(-y, x) for x, y in line] for line in lines]
+    return lines
+
+def eachAxis(lines):
+    return {"horizontal": lines, "vertical": [[(y, x) for x, y in line] for line in lines]}
+
+def eachDirection(lines):
+    return {r: orientLines(lines, r) for r in ["west", "north", "east", "south"]}
+
+# Points are (x, y) tuples and rects are inclusive (left, top, right, bottom)
+# tuples, so none of this needs Qt.
+
+def makeRect(x, y, w, h):
+    # same area as QRect(x, y, w, h)
+    return (x, y, x + w - 1, y + h - 1)
+
+def moveRect(rect, pos):
+    return (rect[0] + pos[0], rect[1] + pos[1], rect[2] + pos[0], rect[3] + pos[1])
+
+def rectContains(rect, pos):
+    return rect[0] <= pos[0] <= rect[2] and rect[1] <= pos[1] <= rect[3]
+
+def unionBounds(a, b):
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+########################################################### 
+
+class Port():
+    __slots__ = ("name", "pos", "direction")
+
+    def __init__(self, name, pos, direction):
+        self.name = name
+        self.pos = pos
+        self.direction = direction
+
+class TextField():
+    __slots__ = ("id", "rect", "align", "format")
+
+    def __init__(self, id, rect, align, fmt="{}"):
+        self.id = id
+        self.rect = rect
+        # "center" or "left"
+        self.align = align
+        self.format = fmt
+
+class Drawable():
+    __slots__ = ()
+
+    def __init__(self):
+        pass
+
+    def in_bounds(self, pos):
+        '''
+        Returns True if the given position is within the bounds of the drawable.
+        '''
+        return rectContains(self.hitRect(), pos)
+    
+    def in_text_bounds(self, pos):
+        '''
+        If the given position is within the bounds of some text within the drawable,
+        return the id of the text. Otherwise, return None.
+        '''
+        for textId, rect in self.textRects():
+            if rectContains(rect, pos):
+                return textId
+        return None
+
+    def hitRect(self):
+        '''
+        Returns the area that in_bounds tests.
+        '''
+        raise NotImplementedError
+
+    def textRects(self):
+        '''
+        Returns (textId, rect) pairs for the areas that in_text_bounds tests.
+        '''
+        raise NotImplementedError
+
+    def paintRect(self):
+        '''
+        Returns a rect covering everything drawing this can touch.
+        '''
+        left, top, right, bottom = self.hitRect()
+        for _, (l, t, r, b) in self.textRects():
+            # values can run past the edges of their text rect
+            left, top, right, bottom = min(left, l - 30), min(top, t), max(right, r + 30), max(bottom, b)
+        margin = 2
+        return (left - margin, top - margin, right + margin, bottom + margin)
+
+    def getPorts(self):
+        raise NotImplementedError
+
+###########################################################
+
+class Wire(Drawable):
+    __slots__ = ("id", "start", "end")
+
+    def __init__(self, id, start, end):
+        super().__init__()
+        self.id = id
+        self.start = start
+        self.end = end
+
+    def getPorts(self):
+        return (Port("start", self.start, "none"), Port("end", self.end, "none"))
+    
+    def getDirection(self):
+        if self.start[0] == self.end[0]:
+            return "vertical"
+        elif self.start[1] == self.end[1]:
+            return "horizontal"
+        else:
+            raise ValueError("Wire is not horizontal or vertical.")
+
+    def hitRect(self):
+        margin = 6
+        return (min(self.start[0], self.end[0]) - margin, min(self.start[1], self.end[1]) - margin,
+                max(self.start[0], self.end[0]) + margin, max(self.start[1], self.end[1]) + margin)
+
+    def textRects(self):
+        return []
+
+###########################################################
+
+class Component(Drawable):
+    symbol = "-"
+    ports = {
+        "all": []
+    }
+    boundingBox = {
+        "all": (0, 0, -1, -1)
+    }
+    textFields = {
+        "all": []
+    }
+    # polylines making up the symbol, relative to pos
+    shape = {
+        "all": []
+    }
+    primaryField = ""
+
+    # subclasses add a slot for each of their text fields
+    __slots__ = ("id", "pos", "r", "_value", "_ports")
+
+    def __init__(self, id, pos, r):
+        super().__init__()
+        self.pos = pos
+        self.id = id
+        self.r = r
+        # primary field parsed as a number, filled in by getValue()
+        self._value = None
+        # (pos, r, ports) from the last getPorts() call
+        self._ports = None
+
+    def getPrimaryField(self):
+        if self.primaryField == "":
+            return ""
+        return getattr(self, self.primaryField)
+
+    def setPrimaryField(self, value):
+        if self.primaryField == "":
+            return
+        self.setField(self.primaryField, value)
+
+    def setField(self, field, value):
+        setattr(self, field, value)
+        if field == self.primaryField:
+            self._value = None
+
+    def getValue(self):
+        '''
+        Returns the primary field as a number, raising ValueError if it doesn't parse.
+        '''
+        if self._value is None:
+            self._value = parseValue(self.getPrimaryField())
+        return self._value
+
+    def getPorts(self):
+        # ports only move with the component, so reuse them until it does
+        if self._ports is None or self._ports[0] != self.pos or self._ports[1] != self.r:
+            x, y = self.pos
+            ports = tuple(Port(port.name, (port.pos[0] + x, port.pos[1] + y), port.direction) for port in getForDir(self.r, self.ports))
+            self._ports = (self.pos, self.r, ports)
+        return self._ports[2]
+
+    def hitRect(self):
+        return moveRect(getForDir(self.r, self.boundingBox), self.pos)
+
+    def textRects(self):
+        return [(textField.id, moveRect(textField.rect, self.pos)) for textField in getForDir(self.r, self.textFields)]
+    
+    def set_pos(self, pos):
+        self.pos = pos
+    def set_r(self, r):
+        self.r = r
+
+###########################################################
+
+class Resistor(Component):
+    symbol = "R"
+    ports = {
+        "horizontal": [Port("p1", (-40,0), "east"), Port("p2", (40,0), "west")],
+        "vertical": [Port("p1", (0,-40), "south"), Port("p2", (0,40), "north")]
+    }
+    boundingBox = {
+        "horizontal": makeRect(-42, -12, 84, 24),
+        "vertical": makeRect(-12, -42, 24, 84),
+    }
+    textFields = {
+        "horizontal": [
+            TextField("resistance", makeRect(-30, 12, 60, 20), "center", "{}Ω"),
+            TextField("id", makeRect(-30, -30, 60, 20), "center", "{}")
+        ],
+        "vertical": [
+            TextField("resistance", makeRect(15, -2, 60, 20), "left", "{}Ω"),
+            TextField("id", makeRect(15, -18, 60, 20), "left", "{}")
+            ]
+    }
+    shape = eachAxis([
+        [(-40,0), (-30,0), (-25,-10), (-15,10), (-5,-10), (5,10), (15,-10), (25,10), (30,0), (40,0)]
+    ])
+    primaryField = "resistance"
+    __slots__ = ("resistance",)
+
+    def __init__(self, id, pos, r, resistance="1k"):
+        super().__init__(id, pos, r)
+        self.resistance = resistance
+
+###########################################################
+
+class Capacitor(Component):
+    symbol = "C"
+    ports = {
+        "horizontal": [Port("p1", (-40,0), "east"), Port("p2", (40,0), "west")],
+        "vertical": [Port("p1", (0,-40), "south"), Port("p2", (0,40), "north")]
+    }
+    boundingBox = {
+        "horizontal": makeRect(-42, -22, 84, 44),
+        "vertical": makeRect(-22, -42, 44, 84),
+    }
+    textFields = {
+        "horizontal": [
+            TextField("capacitance", makeRect(-30, 22, 60, 20), "center", "{}F"),
+            TextField("id", makeRect(-30, -40, 60, 20), "center", "{}")
+        ],
+        "vertical": [
+            TextField("capacitance", makeRect(24, -2, 60, 20), "left", "{}F"),
+            TextField("id", makeRect(24, -18, 60, 20), "left", "{}")
+        ]
+    }
+    shape = eachAxis([ [(-40,0), (-8,0)], [(-8,-20), (-8,20)], [(8,-20), (8,20)], [(8,0), (40,0)] ])
+    primaryField = "capacitance"
+    __slots__ = ("capacitance",)
+
+    def __init__(self, id, pos, r, capacitance="1u"):
+        super().__init__(id, pos, r)
+        self.capacitance = capacitance
+
+###########################################################
+
+class VoltageSource(Component):
+    symbol = "V"
+    ports = {
+        "horizontal": [Port("p1", (-40,0), "east"), Port("p2", (40,0), "west")],
+        "vertical": [Port("p1", (0,-40), "south"), Port("p2", (0,40), "north")]
+    }
+    boundingBox = {
+        "horizontal": makeRect(-42, -22, 84, 44),
+        "vertical": makeRect(-22, -42, 44, 84),
+    }
+    textFields = {
+        "horizontal": [
+            TextField("voltage", makeRect(-30, 22, 60, 20), "center", "{}V"),
+            TextField("id", makeRect(-30, -40, 60, 20), "center", "{}")
+        ],
+        "vertical": [
+            TextField("voltage", makeRect(24, -2, 60, 20), "left", "{}V"),
+            TextField("id", makeRect(24, -18, 60, 20), "left", "{}")
+        ]
+    }
+    shape = eachDirection([ [(-40,0), (-15,0)], [(-15,-12), (-15,12)], [(-5,-20), (-5,20)], [(5,-12), (5,12)], [(15,-20), (15,20)], [(15,0), (40,0)] ])
+    # the long plate ends up on a different port depending on which way it faces
+    positivePort = {"west": "p1", "north": "p1", "east": "p2", "south": "p2"}
+    primaryField = "voltage"
+    __slots__ = ("voltage",)
+
+    def __init__(self, id, pos, r, voltage="5"):
+        super().__init__(id, pos, r)
+        self.voltage = voltage
+
+class Ground(Component):
+    symbol = "G"
+    ports = {
+        "west": [Port("p1", (0,0), "east")],
+        "north": [Port("p1", (0,0), "south")],
+        "east": [Port("p1", (0,0), "west")],
+        "south": [Port("p1", (0,0), "north")]
+    }
+    boundingBox = {
+        "west": makeRect(-2, -22, 44, 44),
+        "north": makeRect(-22, -2, 44, 44),
+        "east": makeRect(-42, -22, 44, 44),
+        "south": makeRect(-22, -42, 44, 44),
+    }
+    textFields = {
+        "all": [],
+    }
+    shape = eachDirection([[(-20, 0), (0,0)], [(-20, -15), (-20, 15)], [(-27, -10), (-27, 10)], [(-34, -5), (-34, 5)]])
+    __slots__ = ()
+
+###########################################################
+
+###########################################################
+
+# symbol -> class, for rebuilding components from saved circuits
+componentTypes = {cls.symbol: cls for cls in [Resistor, Capacitor, VoltageSource, Ground]}
@@ -0,0 +1,142 @@
+from spatialIndex import SpatialIndex
+
+
+class Netlist():
+    '''
+    Groups connection points into electrical nets with a disjoint-set forest.
+    A point is an (x, y) where at least one port or wire end sits. A wire
+    joins every point lying on it, ends and interior alike, so T-junctions
+    connect as well.
+
+    Additions are plain unions. Removals re-union just the net they touched,
+    so no operation ever walks the whole circuit.
+    '''
+
+    def __init__(self, portIndex):
+        # the scene's port index, used to find the points lying along a wire
+        self.portIndex = portIndex
+
+        self.parent = {}
+        self.members = {}
+        self.refs = {}
+
+        # which points each wire runs through and the other way round
+        self.wirePoints = {}
+        self.pointWires = {}
+        self.wireIndex = SpatialIndex()
+
+    def find(self, point):
+        root = point
+        while self.parent[root] != root:
+            root = self.parent[root]
+        # path compression
+        while self.parent[point] != root:
+            self.parent[point], point = root, self.parent[point]
+        return root
+
+    def _union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return
+        if len(self.members[ra]) < len(self.members[rb]):
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.members[ra] |= self.members.pop(rb)
+
+    def netOf(self, point):
+        '''
+        Returns the net id (its root point) of the given (x, y), or None if nothing connects there.
+        '''
+        if point not in self.parent:
+            return None
+        return self.find(point)
+
+    def connected(self, a, b):
+        return a in self.parent and b in self.parent and self.find(a) == self.find(b)
+
+    def nets(self):
+        '''
+        Returns a dict of net id -> set of points. Don't modify it.
+        '''
+        return self.members
+
+    def addPoint(self, point):
+        self.refs[point] = self.refs.get(point, 0) + 1
+        if self.refs[point] > 1:
+            return
+
+        self.parent[point] = point
+        self.members[point] = {point}
+        self.pointWires[point] = set()
+
+        # landing on the middle of an existing wire makes a T-junction
+        for wire in self.wireIndex.query(point):
+            self._union(point, next(iter(self.wirePoints[wire])))
+            self.wirePoints[wire].add(point)
+            self.pointWires[point].add(wire)
+
+    def removePoint(self, point):
+        self.refs[point] -= 1
+        if self.refs[point] > 0:
+            return
+
+        root = self.find(point)
+        del self.refs[point]
+        for wire in self.pointWires.pop(point):
+            self.wirePoints[wire].discard(point)
+        self._rebuild(root, [point])
+
+    def addWire(self, wire):
+        start, end = wire.start, wire.end
+        self.addPoint(start)
+        self.addPoint(end)
+
+        if start[1] == end[1]:
+            along = self.portIndex.portsInRow(start[1], min(start[0], end[0]), max(start[0], end[0]))
+        else:
+            along = self.portIndex.portsInColumn(start[0], min(start[1], end[1]), max(start[1], end[1]))
+
+        points = {start, end}
+        for port in along:
+            point = port.pos
+            if point in self.parent:
+                points.add(point)
+
+        self.wirePoints[wire] = points
+        for point in points:
+            self.pointWires[point].add(wire)
+            self._union(start, point)
+
+        self.wireIndex.insert(wire, (min(start[0], end[0]), min(start[1], end[1]), max(start[0], end[0]), max(start[1], end[1])))
+
+    def removeWire(self, wire):
+        self.wireIndex.remove(wire)
+        points = self.wirePoints.pop(wire)
+        for point in points:
+            self.pointWires[point].discard(wire)
+
+        root = self.find(next(iter(points)))
+        start, end = wire.start, wire.end
+        self._rebuild(root, [])
+        self.removePoint(start)
+        self.removePoint(end)
+
+    def _rebuild(self, root, dropped):
+        # split the net back into singletons and re-union it from its remaining wires
+        affected = self.members.pop(root)
+        for point in dropped:
+            affected.discard(point)
+            del self.parent[point]
+
+        for point in affected:
+            self.parent[point] = point
+            self.members[point] = {point}
+
+        seen = set()
+        for point in affected:
+            for wire in self.pointWires[point]:
+                if wire in seen:
+                    continue
+                seen.add(wire)
+                for other in self.wirePoints[wire]:
+                    self._union(point, other)
@@ -0,0 +1,83 @@
+import bisect
+
+
+class _PortLine():
+    '''
+    Ports that share one row (or column), kept sorted by the lateral coordinate.
+    '''
+
+    def __init__(self):
+        self.keys = []
+        self.ports = []
+
+    def add(self, lat, port):
+        i = bisect.bisect_right(self.keys, lat)
+        self.keys.insert(i, lat)
+        self.ports.insert(i, port)
+
+    def remove(self, lat, port):
+        i = bisect.bisect_left(self.keys, lat)
+        while i < len(self.keys) and self.keys[i] == lat:
+            if self.ports[i] is port:
+                del self.keys[i]
+                del self.ports[i]
+                return
+            i += 1
+
+    def between(self, lo, hi):
+        return self.ports[bisect.bisect_left(self.keys, lo):bisect.bisect_right(self.keys, hi)]
+
+
+class PortIndex():
+    '''
+    Ports of every item and wire, bucketed by row (y) and by column (x) so
+    the ports lying on a horizontal or vertical run can be found with a range query.
+    '''
+
+    def __init__(self):
+        self.rows = {}
+        self.columns = {}
+        self.owners = {}
+
+    def add(self, owner, ports):
+        if owner in self.owners:
+            self.remove(owner)
+
+        self.owners[owner] = ports
+        for port in ports:
+            x, y = port.pos
+            self.rows.setdefault(y, _PortLine()).add(x, port)
+            self.columns.setdefault(x, _PortLine()).add(y, port)
+
+    def remove(self, owner):
+        ports = self.owners.pop(owner, None)
+        if ports is None:
+            return
+
+        for port in ports:
+            x, y = port.pos
+            self._removeFrom(self.rows, y, x, port)
+            self._removeFrom(self.columns, x, y, port)
+
+    def _removeFrom(self, lines, ort, lat, port):
+        line = lines[ort]
+        line.remove(lat, port)
+        if not line.keys:
+            del lines[ort]
+
+    def portsInRow(self, y, lo, hi):
+        '''
+        Returns the ports with the given y and lo <= x <= hi, sorted by x.
+        '''
+        line = self.rows.get(y)
+        return line.between(lo, hi) if line is not None else []
+
+    def portsInColumn(self, x, lo, hi):
+        '''
+        Returns the ports with the given x and lo <= y <= hi, sorted by y.
+        '''
+        line = self.columns.get(x)
+        return line.between(lo, hi) if line is not None else []
+
+    def __len__(self):
+        return sum(len(ports) for ports in self.owners.values())
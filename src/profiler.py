@@ -0,0 +1,91 @@
+'''
+Opt-in timing of the editor's hot paths. While it's off, spans cost one
+attribute check.
+'''
+import collections
+import contextlib
+import functools
+import time
+
+import numpy as np
+
+_nullSpan = contextlib.nullcontext()
+
+
+class _Span():
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, self.start, time.perf_counter_ns() - self.start)
+
+
+class Profiler():
+    '''
+    Keeps the last maxSamples (start, duration) samples of every named span,
+    in nanoseconds.
+    '''
+
+    def __init__(self, enabled=False, maxSamples=2000):
+        self.enabled = enabled
+        self.maxSamples = maxSamples
+        self.samples = {}
+
+    def span(self, name):
+        '''
+        Times a with-block under the given name.
+        '''
+        if not self.enabled:
+            return _nullSpan
+        return _Span(self, name)
+
+    def add(self, name, start, duration):
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = collections.deque(maxlen=self.maxSamples)
+        samples.append((start, duration))
+
+    def percentiles(self, name, qs=(50, 95, 99)):
+        '''
+        Returns the given percentiles of a span's recent durations in ms, or None if it has no samples.
+        '''
+        samples = self.samples.get(name)
+        if not samples:
+            return None
+        durations = np.fromiter((duration for _, duration in samples), dtype=float, count=len(samples))
+        return np.percentile(durations, qs) / 1e6
+
+    def clear(self):
+        self.samples = {}
+
+    def export(self, path):
+        '''
+        Writes every sample as CSV, in the order they started.
+        '''
+        rows = sorted((start, name, duration) for name, samples in self.samples.items() for start, duration in samples)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("span,start_ms,duration_ms\n")
+            for start, name, duration in rows:
+                f.write(f"{name},{start / 1e6:.3f},{duration / 1e6:.4f}\n")
+
+
+def timed(name):
+    '''
+    Method decorator that times every call under name, using self.profiler.
+    '''
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not self.profiler.enabled:
+                return method(self, *args, **kwargs)
+            with _Span(self.profiler, name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,220 @@
+'''
+Wire auto-routing with A* on the 20px grid.
+
+ObstacleMap keeps track of which grid points a new wire can use and is
+updated by the scene as things are added and removed, so routing never has
+to rebuild it. A new wire can't cross a component's body. It can't touch a
+port or wire end either, since that would connect to it. It may cross an
+existing wire straight over, but it can't turn or run along it there, since
+a corner on a wire joins the two.
+'''
+import heapq
+import math
+import time
+
+grid = 20
+
+# step directions, east/west are the horizontal ones
+_steps = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+_horizontal = [True, True, False, False]
+
+
+def _cellsIn(rect):
+    left, top, right, bottom = rect
+    return [(gx, gy)
+            for gx in range(math.ceil(left / grid), math.floor(right / grid) + 1)
+            for gy in range(math.ceil(top / grid), math.floor(bottom / grid) + 1)]
+
+
+def _wireCells(wire):
+    (x0, y0), (x1, y1) = wire.start, wire.end
+    horizontal = y0 == y1
+    lo, hi = (min(x0, x1), max(x0, x1)) if horizontal else (min(y0, y1), max(y0, y1))
+    for v in range(math.ceil(lo / grid), math.floor(hi / grid) + 1):
+        yield ((v, y0 // grid) if horizontal else (x0 // grid, v)), horizontal
+
+
+class ObstacleMap():
+    '''
+    Per grid cell counts of what's there: component bodies, connection
+    points and the interior of wire runs in each axis. Counts rather than
+    flags so overlapping things can be removed independently.
+    '''
+
+    def __init__(self):
+        self.blocked = {}
+        self.pins = {}
+        # cell -> [horizontal runs, vertical runs]
+        self.runs = {}
+        # bumped on every change, so cached routes know when they're stale
+        self.version = 0
+
+    def _bump(self, counts, cell, delta):
+        n = counts.get(cell, 0) + delta
+        if n:
+            counts[cell] = n
+        else:
+            del counts[cell]
+
+    def _changeItem(self, item, delta):
+        ports = set()
+        for port in item.getPorts():
+            cell = (port.pos[0] // grid, port.pos[1] // grid)
+            ports.add(cell)
+            self._bump(self.pins, cell, delta)
+        for cell in _cellsIn(item.hitRect()):
+            if cell not in ports:
+                self._bump(self.blocked, cell, delta)
+        self.version += 1
+
+    def _changeWire(self, wire, delta):
+        ends = {(wire.start[0] // grid, wire.start[1] // grid), (wire.end[0] // grid, wire.end[1] // grid)}
+        for cell in ends:
+            self._bump(self.pins, cell, delta)
+        for cell, horizontal in _wireCells(wire):
+            if cell in ends:
+                continue
+            counts = self.runs.setdefault(cell, [0, 0])
+            counts[0 if horizontal else 1] += delta
+            if counts == [0, 0]:
+                del self.runs[cell]
+        self.version += 1
+
+    def addItem(self, item):
+        self._changeItem(item, 1)
+
+    def removeItem(self, item):
+        self._changeItem(item, -1)
+
+    def addWire(self, wire):
+        self._changeWire(wire, 1)
+
+    def removeWire(self, wire):
+        self._changeWire(wire, -1)
+
+
+class RouteSearch():
+    '''
+    A* for a path of horizontal and vertical runs from start to end, both on
+    the grid, that keeps clear of everything in obstacles and stays within
+    margin cells of the box spanning the ends. It can be run a bit at a
+    time: once done is set, corners holds the corner points including both
+    ends, or None if there's no route.
+    '''
+
+    def __init__(self, obstacles, start, end, turnCost=4, margin=20, maxNodes=50000):
+        self.obstacles = obstacles
+        self.turnCost = turnCost
+        self.maxNodes = maxNodes
+        self.done = start == end
+        self.corners = None
+
+        sx, sy = start[0] // grid, start[1] // grid
+        self.goal = (end[0] // grid, end[1] // grid)
+        ex, ey = self.goal
+        self.bounds = (min(sx, ex) - margin, max(sx, ex) + margin, min(sy, ey) - margin, max(sy, ey) + margin)
+
+        # states are (cell, direction it was entered in), -1 for the start
+        startState = ((sx, sy), -1)
+        self.best = {startState: 0}
+        self.parent = {startState: None}
+        # ties go to the deeper state, which keeps A* from fanning out across equal-cost paths
+        self.heap = [(self._estimate(sx, sy, -1), 0, startState)]
+        self.expanded = 0
+
+    def _estimate(self, x, y, direction):
+        # manhattan distance, plus a turn whenever the goal isn't straight ahead
+        dx, dy = self.goal[0] - x, self.goal[1] - y
+        h = abs(dx) + abs(dy)
+        if direction == -1:
+            return h + (self.turnCost if dx and dy else 0)
+        stepX, stepY = _steps[direction]
+        if (stepX and (dy or dx * stepX < 0)) or (stepY and (dx or dy * stepY < 0)):
+            h += self.turnCost
+        return h
+
+    def _finish(self, corners):
+        self.done = True
+        self.corners = corners
+        # the search state can be big, nothing needs it any more
+        self.heap = self.best = self.parent = None
+
+    def run(self, budgetMs=None):
+        '''
+        Carries on searching, for at most about budgetMs if given. Returns done.
+        '''
+        if self.done:
+            return True
+        deadline = None if budgetMs is None else time.perf_counter() + budgetMs / 1000
+        blocked, pins, runs = self.obstacles.blocked, self.obstacles.pins, self.obstacles.runs
+        minX, maxX, minY, maxY = self.bounds
+        goal, turnCost, estimate = self.goal, self.turnCost, self._estimate
+        heap, best, parent = self.heap, self.best, self.parent
+        while heap:
+            entry = heapq.heappop(heap)
+            _, cost, state = entry
+            cost = -cost
+            if cost > best[state]:
+                continue
+            (x, y), direction = state
+            if (x, y) == goal:
+                self._finish(_corners(state, parent))
+                return True
+
+            self.expanded += 1
+            if self.expanded > self.maxNodes:
+                break
+            # checking the clock on every node would cost more than the nodes
+            if deadline is not None and self.expanded % 256 == 0 and time.perf_counter() > deadline:
+                # put it back for next time, dropping it would lose the best path through it
+                heapq.heappush(heap, entry)
+                return False
+
+            # can't turn while crossing a wire
+            onRun = (x, y) in runs and direction != -1
+            for d, (dx, dy) in enumerate(_steps):
+                if onRun and d != direction:
+                    continue
+                cell = (x + dx, y + dy)
+                if not (minX <= cell[0] <= maxX and minY <= cell[1] <= maxY):
+                    continue
+                if cell != goal:
+                    if cell in blocked or cell in pins:
+                        continue
+                    run = runs.get(cell)
+                    # only straight across, never along
+                    if run is not None and run[0 if _horizontal[d] else 1]:
+                        continue
+                newCost = cost + 1 + (turnCost if direction not in (-1, d) else 0)
+                newState = (cell, d)
+                if newCost < best.get(newState, math.inf):
+                    best[newState] = newCost
+                    parent[newState] = state
+                    heapq.heappush(heap, (newCost + estimate(cell[0], cell[1], d), -newCost, newState))
+        self._finish(None)
+        return True
+
+
+def route(obstacles, start, end, turnCost=4, margin=20, maxNodes=50000):
+    '''
+    Runs a whole RouteSearch and returns its corners, None if there's no route.
+    '''
+    search = RouteSearch(obstacles, start, end, turnCost, margin, maxNodes)
+    search.run()
+    return search.corners
+
+
+def _corners(state, parent):
+    cells = []
+    while state is not None:
+        cells.append(state)
+        state = parent[state]
+    cells.reverse()
+
+    points = [cells[0][0]]
+    for i in range(1, len(cells) - 1):
+        # a cell is a corner when the direction changes after it
+        if cells[i][1] != cells[i + 1][1]:
+            points.append(cells[i][0])
+    points.append(cells[-1][0])
+    return [(x * grid, y * grid) for x, y in points]
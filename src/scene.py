@@ -0,0 +1,160 @@
+from spatialIndex import SpatialIndex
+from portIndex import PortIndex
+from idAllocator import IdAllocator
+from netlist import Netlist
+from wireStore import WireStore
+from router import ObstacleMap
+
+
+class Scene():
+    '''
+    The committed circuit: components and wires by id, components by grid
+    position, and the indexes the editor queries. Everything that adds,
+    removes or edits a drawable goes through here so the indexes stay in sync.
+    '''
+
+    def __init__(self):
+        # dicts keep insertion order, which is also draw order
+        self.items = {}
+        self.wires = {}
+        self.itemsAt = {}
+
+        self.ids = IdAllocator()
+        # ids and component positions of things that are on their way in,
+        # e.g. chunks of a file that haven't loaded yet
+        self.pendingIds = set()
+        self.pendingAt = set()
+
+        # wire coordinates as arrays, wires are hit-tested and drawn from here
+        self.wireStore = WireStore()
+
+        # hover hit-testing of components goes through these instead of scanning everything
+        self.hitIndex = SpatialIndex()
+        self.textIndex = SpatialIndex()
+        self.portIndex = PortIndex()
+        # everything drawing a component touches, in coarser buckets since it's queried by viewport
+        self.paintIndex = SpatialIndex(200)
+
+        # which ports and wire ends are electrically connected
+        self.netlist = Netlist(self.portIndex)
+        # where the auto-router can lay new wires
+        self.obstacles = ObstacleMap()
+
+    def get(self, id):
+        drawable = self.wires.get(id)
+        if drawable is None:
+            drawable = self.items.get(id)
+        return drawable
+
+    def itemAt(self, pos):
+        return self.itemsAt.get(pos)
+
+    def positionTaken(self, pos):
+        return pos in self.itemsAt or pos in self.pendingAt
+
+    def idTaken(self, id):
+        return self.get(id) is not None or id in self.pendingIds or self.ids.inUse(id)
+
+    def nextId(self, prefix):
+        id = self.ids.peek(prefix)
+        # pending ids are only handed to the allocator once they'd be handed out
+        while id in self.pendingIds:
+            self.ids.reserve(id)
+            id = self.ids.peek(prefix)
+        return id
+
+    def reserve(self, ids, positions):
+        '''
+        Keeps ids and component positions from being handed out or placed on
+        until the things they belong to are added.
+        '''
+        self.pendingIds.update(ids)
+        self.pendingAt.update(positions)
+
+    def _checkNew(self, id):
+        if id in self.items or id in self.wires:
+            raise ValueError(f"Duplicate id {id!r}")
+        self.pendingIds.discard(id)
+
+    def addItem(self, item):
+        '''
+        Adds a component. Raises ValueError if its id or position is already taken.
+        '''
+        if item.pos in self.itemsAt:
+            raise ValueError(f"{item.id} is on top of {self.itemsAt[item.pos].id}")
+        self._checkNew(item.id)
+        self.pendingAt.discard(item.pos)
+        self.items[item.id] = item
+        self.itemsAt[item.pos] = item
+        self.ids.reserve(item.id)
+        self._indexItem(item)
+        for port in self.portIndex.owners[item]:
+            self.netlist.addPoint(port.pos)
+        self.obstacles.addItem(item)
+
+    def addWire(self, wire):
+        '''
+        Adds a wire. Raises ValueError if its id is already taken.
+        '''
+        self._checkNew(wire.id)
+        self.wires[wire.id] = wire
+        self.ids.reserve(wire.id)
+        self.wireStore.add(wire.id, wire.start, wire.end)
+        self.portIndex.add(wire, wire.getPorts())
+        self.netlist.addWire(wire)
+        self.obstacles.addWire(wire)
+
+    def remove(self, id):
+        '''
+        Removes the wire or component with the given id and returns it, or None if there isn't one.
+        '''
+        wire = self.wires.pop(id, None)
+        if wire is not None:
+            self.wireStore.remove(id)
+            self.portIndex.remove(wire)
+            self.netlist.removeWire(wire)
+            self.obstacles.removeWire(wire)
+            self.ids.release(id)
+            return wire
+
+        item = self.items.pop(id, None)
+        if item is not None:
+            del self.itemsAt[item.pos]
+            self.obstacles.removeItem(item)
+            for port in self.portIndex.owners[item]:
+                self.netlist.removePoint(port.pos)
+            self._unindexItem(item)
+            self.ids.release(id)
+        return item
+
+    def setField(self, item, field, value):
+        '''
+        Sets a text field of a component. Returns False if it's a rename to an id that is already taken.
+        '''
+        if field == "id":
+            if value == item.id:
+                return True
+            if self.idTaken(value):
+                return False
+            del self.items[item.id]
+            self.ids.release(item.id)
+            self.items[value] = item
+            self.ids.reserve(value)
+
+        item.setField(field, value)
+        self._indexItem(item)
+        return True
+
+    def _indexItem(self, item):
+        self.hitIndex.insert(item, item.hitRect())
+        self.paintIndex.insert(item, item.paintRect())
+        self.portIndex.add(item, item.getPorts())
+        for textId, rect in item.textRects():
+            self.textIndex.insert((item, textId), rect)
+
+    def _unindexItem(self, item):
+        self.hitIndex.remove(item)
+        self.paintIndex.remove(item)
+        self.portIndex.remove(item)
+        for textId, _ in item.textRects():
+            self.textIndex.remove((item, textId))
@@ -0,0 +1,69 @@
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from mna import DcSolver, sweepDc
+
+
+class _SolveSignals(QObject):
+    solved = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+
+
+class _SolveTask(QRunnable):
+    def __init__(self, serial, solve, args, signals):
+        super().__init__()
+        self.serial = serial
+        self.solve = solve
+        self.args = args
+        self.signals = signals
+
+    def run(self):
+        try:
+            result = self.solve(*self.args)
+        except ValueError as e:
+            self.signals.failed.emit(self.serial, str(e))
+            return
+        except Exception as e:
+            # anything escaping here would take the whole app down from the pool thread
+            self.signals.failed.emit(self.serial, f"Solver failed: {e!r}")
+            return
+        self.signals.solved.emit(self.serial, result)
+
+
+class SolveWorker(QObject):
+    '''
+    Solves circuits on a background thread so the editor stays responsive.
+    Only the result of the most recent submit() is reported, older ones are dropped.
+    '''
+    solved = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.serial = 0
+        # keeps its factorization between submits, safe since tasks run one at a time
+        self.dc = DcSolver()
+
+        # lives on this thread, so the task's emits get queued back to it
+        self.signals = _SolveSignals(self)
+        self.signals.solved.connect(self._onSolved)
+        self.signals.failed.connect(self._onFailed)
+
+    def submit(self, elements):
+        self._start(self.dc.solve, elements)
+
+    def submitSweep(self, elements, id, values):
+        self._start(sweepDc, elements, id, values)
+
+    def _start(self, solve, *args):
+        self.serial += 1
+        self.pool.start(_SolveTask(self.serial, solve, args, self.signals))
+
+    def _onSolved(self, serial, result):
+        if serial == self.serial:
+            self.solved.emit(result)
+
+    def _onFailed(self, serial, message):
+        if serial == self.serial:
+            self.failed.emit(message)
@@ -0,0 +1,93 @@
+class SpatialIndex():
+    '''
+    Uniform grid of buckets for hit-testing. Every key is stored with an
+    inclusive rect (left, top, right, bottom) and filed under each bucket the
+    rect overlaps, so a lookup only has to look at the keys near a point.
+    '''
+
+    def __init__(self, cellSize=40):
+        self.cellSize = cellSize
+        self.cells = {}
+        self.entries = {}
+        self.nextSeq = 0
+
+    def _cellSpan(self, rect):
+        left, top, right, bottom = rect
+        s = self.cellSize
+        return range(left // s, right // s + 1), range(top // s, bottom // s + 1)
+
+    def insert(self, key, rect):
+        # seq keeps results in insertion order, like the old list scans.
+        # re-inserting a key moves it but keeps its place in that order
+        if key in self.entries:
+            seq = self.entries[key][1]
+            self.remove(key)
+        else:
+            seq = self.nextSeq
+            self.nextSeq += 1
+        self.entries[key] = (rect, seq)
+
+        xs, ys = self._cellSpan(rect)
+        for cx in xs:
+            for cy in ys:
+                self.cells.setdefault((cx, cy), set()).add(key)
+
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+
+        xs, ys = self._cellSpan(entry[0])
+        for cx in xs:
+            for cy in ys:
+                bucket = self.cells[(cx, cy)]
+                bucket.discard(key)
+                if not bucket:
+                    del self.cells[(cx, cy)]
+
+    def query(self, pos):
+        '''
+        Returns the keys whose rect contains the given (x, y) point, oldest first.
+        '''
+        x, y = pos
+        s = self.cellSize
+        bucket = self.cells.get((x // s, y // s))
+        if not bucket:
+            return []
+
+        hits = []
+        for key in bucket:
+            (left, top, right, bottom), seq = self.entries[key]
+            if left <= x <= right and top <= y <= bottom:
+                hits.append((seq, key))
+        hits.sort(key=lambda hit: hit[0])
+        return [key for _, key in hits]
+
+    def queryRect(self, rect):
+        '''
+        Returns the keys whose rect overlaps the given inclusive rect, oldest first.
+        '''
+        left, top, right, bottom = rect
+        xs, ys = self._cellSpan(rect)
+
+        if len(xs) * len(ys) > len(self.entries):
+            # cheaper to look at everything than to walk mostly empty buckets
+            candidates = self.entries.keys()
+        else:
+            candidates = set()
+            for cx in xs:
+                for cy in ys:
+                    bucket = self.cells.get((cx, cy))
+                    if bucket:
+                        candidates.update(bucket)
+
+        hits = []
+        for key in candidates:
+            (l, t, r, b), seq = self.entries[key]
+            if l <= right and left <= r and t <= bottom and top <= b:
+                hits.append((seq, key))
+        hits.sort(key=lambda hit: hit[0])
+        return [key for _, key in hits]
+
+    def __len__(self):
+        return len(self.entries)
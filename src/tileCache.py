@@ -0,0 +1,93 @@
+import math
+from collections import OrderedDict
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QPixmap, QPainter
+
+
+class TileCache():
+    '''
+    Rasterized tiles of the committed scene, keyed by zoom level and tile
+    coordinate. Each tile is tileSize logical pixels square, so at a given zoom
+    tile (tx, ty) covers the scene from tx * tileSize / zoomValue onwards. The
+    pixmaps are devicePixelSize(dpr) device pixels square so they stay sharp
+    on HiDPI screens.
+    renderTile(painter, rect) is called to fill in a tile that isn't cached,
+    with the painter already set up in scene coordinates.
+    '''
+
+    def __init__(self, renderTile, tileSize=256, maxTiles=256):
+        self.renderTile = renderTile
+        self.tileSize = tileSize
+        self.maxTiles = maxTiles
+
+        # least recently used first
+        self.tiles = OrderedDict()
+        self.zoomValues = {}
+        self.dpr = 1.0
+
+    def sceneTileSize(self, zoomValue):
+        return self.tileSize / zoomValue
+
+    def devicePixelSize(self, dpr):
+        return round(self.tileSize * dpr)
+
+    def tileSpan(self, zoomValue, rect):
+        left, top, right, bottom = rect
+        s = self.sceneTileSize(zoomValue)
+        return (range(math.floor(left / s), math.floor(right / s) + 1),
+                range(math.floor(top / s), math.floor(bottom / s) + 1))
+
+    def tile(self, zoom, zoomValue, tx, ty, dpr=1.0):
+        # moved to a screen with another scale, nothing cached is of use
+        if dpr != self.dpr:
+            self.clear()
+            self.dpr = dpr
+
+        key = (zoom, tx, ty)
+        pixmap = self.tiles.get(key)
+        if pixmap is not None:
+            self.tiles.move_to_end(key)
+            return pixmap
+
+        size = self.devicePixelSize(dpr)
+        pixmap = QPixmap(size, size)
+        # exactly tileSize logical pixels even when tileSize * dpr isn't whole
+        pixmap.setDevicePixelRatio(size / self.tileSize)
+        pixmap.fill(Qt.transparent)
+
+        s = self.sceneTileSize(zoomValue)
+        painter = QPainter()
+        painter.begin(pixmap)
+        painter.scale(zoomValue, zoomValue)
+        painter.translate(-tx * s, -ty * s)
+        # one scene pixel of overlap so strokes on the edge make it into both tiles
+        self.renderTile(painter, (math.floor(tx * s) - 1, math.floor(ty * s) - 1, math.ceil((tx + 1) * s) + 1, math.ceil((ty + 1) * s) + 1))
+        painter.end()
+
+        self.tiles[key] = pixmap
+        self.zoomValues[zoom] = zoomValue
+        while len(self.tiles) > self.maxTiles:
+            self.tiles.popitem(last=False)
+        return pixmap
+
+    def invalidate(self, rect):
+        '''
+        Drops every cached tile, at any zoom level, that overlaps the given scene rect.
+        '''
+        for zoom, zoomValue in self.zoomValues.items():
+            xs, ys = self.tileSpan(zoomValue, rect)
+            if len(xs) * len(ys) > len(self.tiles):
+                for key in [key for key in self.tiles if key[0] == zoom and key[1] in xs and key[2] in ys]:
+                    del self.tiles[key]
+            else:
+                for tx in xs:
+                    for ty in ys:
+                        self.tiles.pop((zoom, tx, ty), None)
+
+    def clear(self):
+        self.tiles.clear()
+        self.zoomValues.clear()
+
+    def __len__(self):
+        return len(self.tiles)
@@ -0,0 +1,53 @@
+import functools
+import re
+
+import numpy as np
+
+siPrefixes = {
+    "f": 1e-15, "p": 1e-12, "n": 1e-9, "u": 1e-6, "µ": 1e-6, "m": 1e-3,
+    "k": 1e3, "M": 1e6, "G": 1e9, "T": 1e12,
+}
+
+# "4.7k", "1e-3", "10uF", "5 V" and the "4k7" style where the prefix stands in for the decimal point
+_valuePattern = re.compile(r"^\s*([+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)\s*([fpnuµmkMGT]?)\s*(?:Ω|ohm|V|A|F)?\s*$")
+_infixPattern = re.compile(r"^\s*(\d+)([fpnuµmkMGT])(\d+)\s*(?:Ω|ohm|V|A|F)?\s*$")
+
+
+@functools.lru_cache(maxsize=4096)
+def parseValue(text):
+    '''
+    Parses a component value like "1k" or "4.7u" into a float. Raises ValueError if it isn't one.
+    '''
+    match = _valuePattern.match(text)
+    if match is not None:
+        return float(match.group(1)) * siPrefixes.get(match.group(2), 1.0)
+
+    match = _infixPattern.match(text)
+    if match is not None:
+        return float(f"{match.group(1)}.{match.group(3)}") * siPrefixes[match.group(2)]
+
+    raise ValueError(f"Not a value: {text!r}")
+
+
+
+def parseValues(texts):
+    '''
+    Parses a sequence of value strings into a float array.
+    '''
+    return np.fromiter(map(parseValue, texts), dtype=float, count=len(texts))
+
+
+def valuesOf(items, kind):
+    '''
+    Returns the parsed primary values of every component with the given symbol,
+    in order. Raises ValueError naming the first one that doesn't parse.
+    '''
+    items = [item for item in items if item.symbol == kind]
+    return np.fromiter(map(_valueOf, items), dtype=float, count=len(items))
+
+
+def _valueOf(item):
+    try:
+        return item.getValue()
+    except ValueError:
+        raise ValueError(f"{item.id} has an invalid value: {item.getPrimaryField()!r}") from None
@@ -0,0 +1,90 @@
+import numpy as np
+
+from spatialIndex import SpatialIndex
+
+
+class WireStore():
+    '''
+    Wire coordinates mirrored into parallel int32 arrays, so hit-testing and
+    drawing large schematics is a handful of vectorized operations instead of
+    a loop over Wire objects. The Wire objects in the scene stay the source of
+    truth for ports, nets and saving; this only adds a copy of their ends and
+    doesn't save any memory. Rows are packed: removing one moves the last row
+    into its place, and seq keeps track of the order wires were added in. A
+    grid index of ids narrows queries down to the wires near them first.
+    '''
+
+    # same margins as Wire.hitRect() and Wire.paintRect()
+    hitMargin = 6
+    paintMargin = 8
+
+    def __init__(self, capacity=64):
+        # columns are x0, y0, x1, y1
+        self.coords = np.zeros((capacity, 4), dtype=np.int32)
+        self.seq = np.zeros(capacity, dtype=np.int64)
+        self.ids = []
+        self.rowOf = {}
+        self.nextSeq = 0
+        # paint rects by id, ids rather than rows since rows move on remove
+        self.index = SpatialIndex(64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, id):
+        return id in self.rowOf
+
+    def add(self, id, start, end):
+        if id in self.rowOf:
+            raise ValueError(f"Wire {id} is already stored.")
+        row = len(self.ids)
+        if row == len(self.coords):
+            self.coords = np.concatenate([self.coords, np.zeros_like(self.coords)])
+            self.seq = np.concatenate([self.seq, np.zeros_like(self.seq)])
+        self.coords[row] = (start[0], start[1], end[0], end[1])
+        self.seq[row] = self.nextSeq
+        self.nextSeq += 1
+        self.ids.append(id)
+        self.rowOf[id] = row
+        m = self.paintMargin
+        self.index.insert(id, (min(start[0], end[0]) - m, min(start[1], end[1]) - m,
+                               max(start[0], end[0]) + m, max(start[1], end[1]) + m))
+
+    def remove(self, id):
+        row = self.rowOf.pop(id)
+        self.index.remove(id)
+        last = len(self.ids) - 1
+        if row != last:
+            self.coords[row] = self.coords[last]
+            self.seq[row] = self.seq[last]
+            self.ids[row] = self.ids[last]
+            self.rowOf[self.ids[row]] = row
+        self.ids.pop()
+
+    def hitTest(self, pos):
+        '''
+        Returns the ids of wires whose hit rect contains pos, oldest first.
+        '''
+        # the index holds paint rects, which are a little bigger
+        ids = self.index.query(pos)
+        if not ids:
+            return []
+        c = self.coords[np.fromiter(map(self.rowOf.__getitem__, ids), dtype=np.intp, count=len(ids))]
+        x, y = pos
+        m = self.hitMargin
+        hit = ((np.minimum(c[:, 0], c[:, 2]) - m <= x) & (x <= np.maximum(c[:, 0], c[:, 2]) + m) &
+               (np.minimum(c[:, 1], c[:, 3]) - m <= y) & (y <= np.maximum(c[:, 1], c[:, 3]) + m))
+        return [id for id, isHit in zip(ids, hit.tolist()) if isHit]
+
+    def rowsIn(self, rect, exclude=()):
+        '''
+        Returns the rows of wires whose paint rect overlaps rect, leaving out the given ids.
+        '''
+        rowOf = self.rowOf
+        return np.fromiter((rowOf[id] for id in self.index.queryRect(rect) if id not in exclude), dtype=np.intp)
+
+    def lines(self, rows):
+        '''
+        Returns the (x0, y0, x1, y1) rows for the given row numbers as an int32 array.
+        '''
+        return self.coords[rows]
@@ -0,0 +1,9 @@
+import json
+
+from circuitFile import sceneToDict
+
+
+def contents(scene):
+    # order-independent view of everything in a scene, for comparing two of them
+    data = sceneToDict(scene)
+    return sorted(map(json.dumps, data["components"])), sorted(map(json.dumps, data["wires"]))
@@ -0,0 +1,113 @@
+import os
+import random
+import tempfile
+import unittest
+
+from circuitBinary import CircuitReader, coordinateLimit, loadBinary, saveBinary
+from circuitFile import loadCircuit, saveCircuit
+from model import Capacitor, Ground, Resistor, VoltageSource, Wire
+from scene import Scene
+
+from .helpers import contents
+
+
+def randomScene(seed, items=60, wires=120):
+    random.seed(seed)
+    scene = Scene()
+    for _ in range(items):
+        pos = (random.randint(-200, 200) * 20, random.randint(-200, 200) * 20)
+        if scene.positionTaken(pos):
+            continue
+        cls = random.choice([Resistor, Capacitor, VoltageSource, Ground])
+        item = cls(scene.nextId(cls.symbol), pos, random.choice(["west", "north", "east", "south"]))
+        if cls.primaryField != "":
+            item.setPrimaryField(random.choice(["1k", "4.7u", "12", "µ"]))
+        scene.addItem(item)
+    for _ in range(wires):
+        x, y = random.randint(-200, 200) * 20, random.randint(-200, 200) * 20
+        scene.addWire(Wire(scene.nextId("wire"), (x, y), (x + random.randint(1, 10) * 20, y)))
+    return scene
+
+
+class CircuitBinaryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def testRoundTrip(self):
+        scene = randomScene(1)
+        # small chunks so the scene spreads over many
+        saveBinary(scene, self.path("a.circ"), chunkSize=256)
+        self.assertEqual(contents(loadBinary(self.path("a.circ"))), contents(scene))
+
+        saveCircuit(scene, self.path("a.json"))
+        self.assertEqual(contents(loadCircuit(self.path("a.json"))), contents(scene))
+
+    def testReaderReservesEverything(self):
+        scene = randomScene(2)
+        saveBinary(scene, self.path("a.circ"), chunkSize=256)
+        with CircuitReader(self.path("a.circ")) as reader:
+            self.assertEqual(sorted(reader.ids()), sorted(list(scene.items) + list(scene.wires)))
+            self.assertEqual(sorted(reader.positions()), sorted(item.pos for item in scene.items.values()))
+            self.assertGreater(len(reader), 1)
+
+            # an empty scene that only knows what's coming hands out fresh ids
+            partial = Scene()
+            partial.reserve(reader.ids(), reader.positions())
+            self.assertNotIn(partial.nextId("R"), scene.items)
+            self.assertNotIn(partial.nextId("wire"), scene.wires)
+            for item in scene.items.values():
+                self.assertTrue(partial.positionTaken(item.pos))
+
+    def testChunksInView(self):
+        scene = Scene()
+        scene.addItem(Resistor("R1", (0, 0), "west"))
+        scene.addItem(Resistor("R2", (50000, 50000), "west"))
+        saveBinary(scene, self.path("a.circ"))
+        with CircuitReader(self.path("a.circ")) as reader:
+            chunks = reader.chunksIn((-100, -100, 100, 100)).tolist()
+            self.assertEqual(len(chunks), 1)
+            items, wires = reader.readChunk(chunks[0])
+            self.assertEqual([item.id for item in items], ["R1"])
+
+    def testCorruptionOnlyRaisesValueError(self):
+        scene = randomScene(3, items=4, wires=4)
+        saveBinary(scene, self.path("a.circ"))
+        with open(self.path("a.circ"), "rb") as f:
+            data = f.read()
+        rejected = 0
+        for i in range(len(data)):
+            for value in (0x00, 0x07, 0xFF):
+                corrupt = bytearray(data)
+                corrupt[i] = value
+                with open(self.path("b.circ"), "wb") as f:
+                    f.write(corrupt)
+                try:
+                    loadBinary(self.path("b.circ"))
+                except ValueError:
+                    rejected += 1
+        self.assertGreater(rejected, 0)
+
+    def testRejectsWhatTheEditorCantHold(self):
+        scene = Scene()
+        scene.addWire(Wire("wire1", (0, 0), (40, 40)))
+        saveBinary(scene, self.path("diagonal.circ"))
+        with self.assertRaises(ValueError):
+            loadBinary(self.path("diagonal.circ"))
+
+        scene = Scene()
+        scene.addItem(Resistor("R1", (coordinateLimit + 20, 0), "west"))
+        with self.assertRaises(ValueError):
+            saveBinary(scene, self.path("far.circ"))
+
+    def testEmptyFile(self):
+        open(self.path("empty.circ"), "wb").close()
+        with self.assertRaises(ValueError):
+            CircuitReader(self.path("empty.circ"))
+
+
+if __name__ == "__main__":
+    unittest.main()
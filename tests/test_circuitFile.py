@@ -0,0 +1,38 @@
+import unittest
+
+from circuitBinary import coordinateLimit
+from circuitFile import componentFromDict, sceneFromDict, wireFromDict
+
+
+def circuit(wires=(), components=()):
+    return {"components": list(components), "wires": list(wires)}
+
+
+class CircuitFileTest(unittest.TestCase):
+    def testRejectsWhatTheEditorCantHold(self):
+        for start, end in [((0, 0), (40, 40)), ((0, 0), (0, 200000000)), ((0, 0), (10 ** 30, 0))]:
+            wire = {"id": "wire1", "start": start, "end": end}
+            with self.assertRaises(ValueError):
+                sceneFromDict(circuit([wire]))
+            with self.assertRaises(ValueError):
+                wireFromDict(wire)
+
+        far = {"type": "R", "id": "R1", "x": coordinateLimit + 20, "y": 0, "r": "west"}
+        with self.assertRaises(ValueError):
+            sceneFromDict(circuit(components=[far]))
+        with self.assertRaises(ValueError):
+            componentFromDict(far)
+
+    def testMalformed(self):
+        for data in [{}, circuit([{"id": "wire1"}]), circuit([{"id": "wire1", "start": [0], "end": [0, 0]}]), []]:
+            with self.assertRaises(ValueError):
+                sceneFromDict(data)
+
+    def testAcceptsTheLimit(self):
+        wire = {"id": "wire1", "start": [-coordinateLimit, 0], "end": [coordinateLimit, 0]}
+        scene = sceneFromDict(circuit([wire]))
+        self.assertEqual(scene.wires["wire1"].end, (coordinateLimit, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+from history import AddObjects, History, RemoveObjects, SetField
+from model import Resistor, Wire
+from scene import Scene
+
+
+class HistoryTest(unittest.TestCase):
+    def testUndoRedo(self):
+        scene, history = Scene(), History()
+        r1 = Resistor("R1", (0, 0), "west")
+        wire = Wire("wire1", (40, 0), (100, 0))
+        history.do(AddObjects([r1], [wire]), scene)
+        history.do(SetField(r1, "resistance", "1k", "4k7"), scene)
+        history.do(RemoveObjects([wire]), scene)
+        self.assertEqual(list(scene.wires), [])
+
+        self.assertTrue(history.undo(scene))
+        # the original object comes back, not a copy
+        self.assertIs(scene.wires["wire1"], wire)
+        self.assertTrue(history.undo(scene))
+        self.assertEqual(r1.resistance, "1k")
+        self.assertTrue(history.redo(scene))
+        self.assertEqual(r1.resistance, "4k7")
+        self.assertTrue(history.undo(scene))
+        self.assertTrue(history.undo(scene))
+        self.assertEqual(list(scene.items), [])
+        self.assertFalse(history.undo(scene))
+
+    def testPushClearsRedo(self):
+        scene, history = Scene(), History()
+        history.do(AddObjects([Resistor("R1", (0, 0), "west")]), scene)
+        history.do(AddObjects([Resistor("R2", (100, 0), "west")]), scene)
+        history.undo(scene)
+        self.assertTrue(history.canRedo())
+
+        history.do(AddObjects([Resistor("R3", (200, 0), "west")]), scene)
+        self.assertFalse(history.canRedo())
+        self.assertFalse(history.redo(scene))
+        self.assertEqual(history.cost, sum(command.cost for command in history.undoStack))
+
+    def testBudgetDropsOldestSteps(self):
+        scene = Scene()
+        cost = AddObjects([Resistor("R0", (0, 0), "west")]).cost
+        history = History(budget=3 * cost)
+        for i in range(10):
+            history.do(AddObjects([Resistor(f"R{i + 1}", (i * 100, 0), "west")]), scene)
+
+        self.assertEqual(len(history.undoStack), 3)
+        self.assertLessEqual(history.cost, history.budget)
+        while history.undo(scene):
+            pass
+        # only the newest three could be undone
+        self.assertEqual(sorted(scene.items), [f"R{i}" for i in range(1, 8)])
+
+    def testOversizedCommandIsKept(self):
+        scene, history = Scene(), History(budget=1)
+        history.do(AddObjects([Resistor("R1", (0, 0), "west")]), scene)
+        self.assertTrue(history.canUndo())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import random
+import unittest
+
+from idAllocator import IdAllocator
+
+
+class IdAllocatorTest(unittest.TestCase):
+    def testHandsOutSmallestFree(self):
+        random.seed(3)
+        ids = IdAllocator()
+        used = set()
+        for _ in range(3000):
+            r = random.random()
+            if r < 0.4:
+                id = ids.allocate("R")
+                num = 1
+                while num in used:
+                    num += 1
+                self.assertEqual(id, f"R{num}")
+                used.add(num)
+            elif r < 0.6:
+                num = random.randint(1, 60)
+                ids.reserve(f"R{num}")
+                used.add(num)
+            elif used:
+                num = random.choice(sorted(used))
+                ids.release(f"R{num}")
+                used.discard(num)
+            self.assertTrue(all(ids.inUse(f"R{num}") for num in used))
+
+    def testPrefixesAreSeparate(self):
+        ids = IdAllocator()
+        ids.reserve("R1")
+        self.assertEqual(ids.peek("R"), "R2")
+        self.assertEqual(ids.peek("C"), "C1")
+        self.assertEqual(ids.peek("wire"), "wire1")
+
+    def testIgnoresUnnumberedIds(self):
+        ids = IdAllocator()
+        ids.reserve("input")
+        ids.reserve("R01")
+        self.assertEqual(ids.peek("R"), "R1")
+        self.assertFalse(ids.inUse("input"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import os
+import random
+import tempfile
+import unittest
+
+from journal import Journal, lockedJournal
+from model import Resistor, Wire
+from scene import Scene
+
+from .helpers import contents
+
+
+def randomEdits(scene, journal, steps, seed):
+    random.seed(seed)
+    for _ in range(steps):
+        r = random.random()
+        if r < 0.4:
+            pos = (random.randint(-20, 20) * 20, random.randint(-20, 20) * 20)
+            if not scene.positionTaken(pos):
+                item = Resistor(scene.nextId("R"), pos, random.choice(["west", "north"]))
+                scene.addItem(item)
+                journal.place(item)
+        elif r < 0.7:
+            x, y = random.randint(-20, 20) * 20, random.randint(-20, 20) * 20
+            wire = Wire(scene.nextId("wire"), (x, y), (x + 40, y))
+            scene.addWire(wire)
+            journal.wire(wire)
+        elif r < 0.85:
+            ids = list(scene.items) + list(scene.wires)
+            if ids:
+                id = random.choice(ids)
+                scene.remove(id)
+                journal.remove(id)
+        elif scene.items:
+            item = scene.items[random.choice(list(scene.items))]
+            field, value = random.choice([("resistance", f"{random.randint(1, 99)}k"), ("id", f"X{random.randint(1, 300)}")])
+            old = item.id
+            if scene.setField(item, field, value):
+                journal.field(old, field, value)
+
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "autosave")
+
+    def testRecoverAcrossCompactions(self):
+        scene = Scene()
+        journal = Journal(self.path, compactEvery=37)
+        journal.start(scene)
+        randomEdits(scene, journal, 1500, seed=3)
+        # stands in for a crash: the files are left as they are, minus a running compaction
+        journal.wait()
+
+        recovered = Journal(self.path)
+        self.assertEqual(contents(recovered.recover()), contents(scene))
+        recovered.close()
+        again = Journal(self.path)
+        self.assertEqual(contents(again.recover()), contents(scene))
+        again.close()
+
+    def testTornLastLine(self):
+        scene = Scene()
+        journal = Journal(self.path)
+        journal.start(scene)
+        randomEdits(scene, journal, 50, seed=4)
+        journal.file.write('{"op": "pla')
+        journal.close()
+
+        recovered = Journal(self.path)
+        self.assertEqual(contents(recovered.recover()), contents(scene))
+        recovered.close()
+
+    def testNothingToRecover(self):
+        journal = Journal(self.path)
+        self.assertIsNone(journal.recover())
+        journal.close()
+
+    def testBrokenAutosave(self):
+        journal = Journal(self.path)
+        journal.start(Scene())
+        journal.field("R9", "resistance", "1k")
+        journal.close()
+
+        broken = Journal(self.path)
+        with self.assertRaises(ValueError):
+            broken.recover()
+        aside = broken.setAside()
+        self.assertTrue(os.path.isdir(aside))
+        self.assertEqual(os.listdir(self.path), [])
+        self.assertIsNone(broken.recover())
+        broken.close()
+
+    def testSecondEditorGetsItsOwnDirectory(self):
+        scene = Scene()
+        first = lockedJournal(self.path)
+        first.start(scene)
+        randomEdits(scene, first, 50, seed=5)
+        before = sorted(os.listdir(self.path))
+
+        # the first editor is still running, so its journal is left alone
+        second = lockedJournal(self.path)
+        self.assertEqual(second.directory, f"{self.path}.2")
+        self.assertIsNone(second.recover())
+        second.start(Scene())
+        self.assertEqual(sorted(os.listdir(self.path)), before)
+        second.release()
+
+        # once it's gone, the next editor takes over its autosave
+        first.release()
+        third = lockedJournal(self.path)
+        self.assertEqual(third.directory, self.path)
+        self.assertEqual(contents(third.recover()), contents(scene))
+        third.release()
+
+    def testEverySlotTaken(self):
+        first = lockedJournal(self.path, slots=1)
+        self.assertIsNone(lockedJournal(self.path, slots=1))
+        first.release()
+
+
+if __name__ == "__main__":
+    unittest.main()
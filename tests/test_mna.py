@@ -0,0 +1,152 @@
+import unittest
+
+import numpy as np
+
+from mna import Element, DcSolver, acSweep, solveDc, sweepDc, transient
+
+
+def divider(r1=1000.0, r2=3000.0, v=10.0):
+    # V1 drives R1 into R2 to ground, out is the node between them
+    return [
+        Element("G", "G1", ("gnd",), None),
+        Element("V", "V1", ("in", "gnd"), v),
+        Element("R", "R1", ("in", "out"), r1),
+        Element("R", "R2", ("out", "gnd"), r2),
+    ]
+
+
+def lowPass(r=1000.0, c=1e-6, v=10.0):
+    return [
+        Element("G", "G1", ("gnd",), None),
+        Element("V", "V1", ("in", "gnd"), v),
+        Element("R", "R1", ("in", "out"), r),
+        Element("C", "C1", ("out", "gnd"), c),
+    ]
+
+
+class SolveDcTest(unittest.TestCase):
+    def testDivider(self):
+        result = solveDc(divider())
+        self.assertAlmostEqual(result.nodeVoltages["out"], 7.5, places=6)
+        self.assertAlmostEqual(result.voltages["R1"], 2.5, places=6)
+        self.assertAlmostEqual(result.currents["R2"], 2.5e-3, places=9)
+        # the source's current runs from its positive node through it, against the loop
+        self.assertAlmostEqual(result.currents["V1"], -2.5e-3, places=9)
+
+    def testCapacitorIsOpen(self):
+        result = solveDc(lowPass())
+        self.assertAlmostEqual(result.voltages["C1"], 10.0, places=6)
+        self.assertEqual(result.currents["C1"], 0.0)
+
+    def testErrors(self):
+        with self.assertRaises(ValueError):
+            solveDc(divider()[1:])
+        with self.assertRaises(ValueError):
+            solveDc(divider(r1=0.0))
+        shorted = divider() + [Element("V", "V2", ("in", "gnd"), 5.0)]
+        with self.assertRaises(ValueError):
+            solveDc(shorted)
+
+
+class DcSolverTest(unittest.TestCase):
+    def testEditsMatchFullSolve(self):
+        rng = np.random.default_rng(5)
+        elements = [Element("G", "G1", ("gnd",), None), Element("V", "V1", (0, "gnd"), 5.0)]
+        for k in range(40):
+            elements.append(Element("R", f"R{k}", (k, k + 1 if k < 39 else "gnd"), float(rng.uniform(100, 1e4))))
+            elements.append(Element("R", f"S{k}", (k, "gnd"), float(rng.uniform(1e3, 1e5))))
+
+        solver = DcSolver()
+        solver.solve(elements)
+        for _ in range(10):
+            i = int(rng.integers(2, len(elements)))
+            elements[i] = elements[i]._replace(value=float(rng.uniform(100, 1e4)))
+            result, expected = solver.solve(elements), solveDc(elements)
+            for id, v in expected.voltages.items():
+                self.assertAlmostEqual(result.voltages[id], v, places=9)
+            for id, i in expected.currents.items():
+                self.assertAlmostEqual(result.currents[id], i, places=12)
+        self.assertEqual(solver.factorizations, 1)
+
+        elements[1] = elements[1]._replace(value=9.0)
+        self.assertAlmostEqual(solver.solve(elements).voltages["V1"], 9.0)
+        solver.solve(elements[:-1])
+        self.assertEqual(solver.factorizations, 2)
+
+
+class SweepTest(unittest.TestCase):
+    def testResistorSweep(self):
+        values = np.geomspace(100, 1e4, 9)
+        # a tiny budget forces several stacks
+        result = sweepDc(divider(), "R2", values, maxBytes=300)
+        np.testing.assert_allclose(result.voltages["R2"], 10 * values / (1000 + values), rtol=1e-8)
+        np.testing.assert_allclose(result.currents["R2"], 10 / (1000 + values), rtol=1e-8)
+
+    def testSourceSweep(self):
+        result = sweepDc(divider(), "V1", [1, 2, 4])
+        np.testing.assert_allclose(result.voltages["R2"], [0.75, 1.5, 3.0], rtol=1e-8)
+
+    def testEverythingOnGround(self):
+        elements = [Element("G", "G1", ("gnd",), None), Element("R", "R1", ("gnd", "gnd"), 5.0)]
+        result = sweepDc(elements, "R1", [1, 2])
+        np.testing.assert_array_equal(result.voltages["R1"], [0, 0])
+
+    def testErrors(self):
+        for id, values in [("G1", [1]), ("R9", [1]), ("R1", [0, 1])]:
+            with self.assertRaises(ValueError):
+                sweepDc(divider(), id, values)
+        with self.assertRaises(ValueError):
+            sweepDc(divider(), "R1", [1, 2], maxBytes=8)
+
+
+class TransientTest(unittest.TestCase):
+    def simulate(self, method, step=1e-5):
+        chunks = list(transient(lowPass(), step, 5e-3, method, chunkSteps=100))
+        times = np.concatenate([chunk.times for chunk in chunks])
+        voltage = np.concatenate([chunk.voltages["C1"] for chunk in chunks])
+        current = np.concatenate([chunk.currents["C1"] for chunk in chunks])
+        resistorCurrent = np.concatenate([chunk.currents["R1"] for chunk in chunks])
+        return chunks, times, voltage, current, resistorCurrent
+
+    def testTrapezoidalMatchesExponential(self):
+        chunks, times, voltage, current, resistorCurrent = self.simulate("trapezoidal")
+        self.assertEqual(len(times), 501)
+        self.assertTrue(all(len(chunk.times) <= 100 for chunk in chunks))
+        np.testing.assert_allclose(voltage, 10 * (1 - np.exp(-times / 1e-3)), atol=1e-4)
+        np.testing.assert_allclose(current, resistorCurrent, atol=1e-9)
+        self.assertAlmostEqual(current[0], 0.01)
+
+    def testBackwardEulerConverges(self):
+        errors = []
+        for step in [2e-5, 1e-5]:
+            _, times, voltage, _, _ = self.simulate("backwardEuler", step)
+            errors.append(np.abs(voltage - 10 * (1 - np.exp(-times / 1e-3))).max())
+        # first order: halving the step roughly halves the error
+        self.assertLess(errors[1], errors[0] * 0.6)
+
+    def testErrors(self):
+        with self.assertRaises(ValueError):
+            transient(lowPass(), 0, 1)
+        with self.assertRaises(ValueError):
+            transient(lowPass(), 1e-5, 1e-3, "euler")
+
+
+class AcSweepTest(unittest.TestCase):
+    def testLowPassBode(self):
+        frequencies = np.geomspace(1, 1e6, 2000)
+        result = acSweep(lowPass(), "V1", frequencies)
+        expected = 1 / (1 + 2j * np.pi * frequencies * 1e-3)
+        np.testing.assert_allclose(result.voltages["C1"], expected, atol=1e-8)
+        np.testing.assert_allclose(result.currents["C1"], result.currents["R1"], atol=1e-12)
+        corner = np.argmin(np.abs(frequencies - 1 / (2 * np.pi * 1e-3)))
+        self.assertAlmostEqual(abs(result.voltages["C1"][corner]), 2 ** -0.5, places=2)
+
+    def testErrors(self):
+        with self.assertRaises(ValueError):
+            acSweep(lowPass(), "R1", [1.0])
+        with self.assertRaises(ValueError):
+            acSweep(lowPass(), "V1", [1.0], maxBytes=8)
+
+
+if __name__ == "__main__":
+    unittest.main()
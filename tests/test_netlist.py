@@ -0,0 +1,76 @@
+import random
+import unittest
+
+from model import Resistor, Wire
+from scene import Scene
+
+
+def bruteForceNets(scene):
+    # every port and wire end, joined by every wire they lie on
+    points = {port.pos for item in scene.items.values() for port in item.getPorts()}
+    for wire in scene.wires.values():
+        points.update([wire.start, wire.end])
+    parent = {point: point for point in points}
+
+    def find(point):
+        while parent[point] != point:
+            point = parent[point]
+        return point
+
+    for wire in scene.wires.values():
+        (x0, y0), (x1, y1) = wire.start, wire.end
+        for point in points:
+            if min(x0, x1) <= point[0] <= max(x0, x1) and min(y0, y1) <= point[1] <= max(y0, y1):
+                parent[find(point)] = find(wire.start)
+    return {point: find(point) for point in points}
+
+
+class NetlistTest(unittest.TestCase):
+    def assertMatchesBruteForce(self, scene):
+        expected = bruteForceNets(scene)
+        netlist = scene.netlist
+        self.assertEqual(set(netlist.parent), set(expected))
+        points = sorted(expected)
+        for a in points:
+            for b in points:
+                self.assertEqual(netlist.connected(a, b), expected[a] == expected[b], (a, b))
+
+    def testTJunction(self):
+        scene = Scene()
+        scene.addWire(Wire("wire1", (0, 0), (100, 0)))
+        scene.addWire(Wire("wire2", (40, 0), (40, 60)))
+        self.assertTrue(scene.netlist.connected((0, 0), (40, 60)))
+        scene.remove("wire1")
+        self.assertFalse(scene.netlist.connected((40, 0), (0, 0)))
+
+    def testCrossingWiresDontConnect(self):
+        scene = Scene()
+        scene.addWire(Wire("wire1", (0, 0), (100, 0)))
+        scene.addWire(Wire("wire2", (40, -40), (40, 40)))
+        self.assertFalse(scene.netlist.connected((0, 0), (40, 40)))
+
+    def testRandomEditsMatchBruteForce(self):
+        random.seed(7)
+        scene = Scene()
+        for step in range(400):
+            r = random.random()
+            if r < 0.25:
+                pos = (random.randint(-4, 4) * 20, random.randint(-4, 4) * 20)
+                if not scene.positionTaken(pos):
+                    scene.addItem(Resistor(scene.nextId("R"), pos, random.choice(["west", "north"])))
+            elif r < 0.65:
+                x, y = random.randint(-6, 6) * 20, random.randint(-6, 6) * 20
+                length = random.choice([-1, 1]) * random.randint(1, 6) * 20
+                end = (x + length, y) if random.random() < 0.5 else (x, y + length)
+                scene.addWire(Wire(scene.nextId("wire"), (x, y), end))
+            else:
+                ids = list(scene.items) + list(scene.wires)
+                if ids:
+                    scene.remove(random.choice(ids))
+            if step % 20 == 0:
+                self.assertMatchesBruteForce(scene)
+        self.assertMatchesBruteForce(scene)
+
+
+if __name__ == "__main__":
+    unittest.main()
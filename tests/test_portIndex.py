@@ -0,0 +1,56 @@
+import random
+import unittest
+
+from model import Port
+from portIndex import PortIndex
+
+
+class PortIndexTest(unittest.TestCase):
+    def testMatchesBruteForce(self):
+        random.seed(2)
+        index = PortIndex()
+        owners = {}
+        for step in range(400):
+            if owners and random.random() < 0.3:
+                owner = random.choice(list(owners))
+                index.remove(owner)
+                del owners[owner]
+            else:
+                ports = [Port(str(i), (random.randint(-20, 20), random.randint(-20, 20)), 0) for i in range(random.randint(1, 4))]
+                owners[step] = ports
+                index.add(step, ports)
+
+            allPorts = [port for ports in owners.values() for port in ports]
+            y, lo, hi = random.randint(-20, 20), random.randint(-25, 5), random.randint(-5, 25)
+            found = index.portsInRow(y, lo, hi)
+            self.assertEqual([p.pos[0] for p in found], sorted(p.pos[0] for p in found))
+            self.assertEqual(sorted(map(id, found)), sorted(id(p) for p in allPorts if p.pos[1] == y and lo <= p.pos[0] <= hi))
+
+            x = random.randint(-20, 20)
+            found = index.portsInColumn(x, lo, hi)
+            self.assertEqual([p.pos[1] for p in found], sorted(p.pos[1] for p in found))
+            self.assertEqual(sorted(map(id, found)), sorted(id(p) for p in allPorts if p.pos[0] == x and lo <= p.pos[1] <= hi))
+
+    def testReaddReplacesPorts(self):
+        index = PortIndex()
+        old = Port("a", (0, 0), 0)
+        new = Port("a", (5, 0), 0)
+        index.add("owner", [old])
+        index.add("owner", [new])
+        self.assertEqual(index.portsInRow(0, -10, 10), [new])
+        index.remove("owner")
+        self.assertEqual(index.portsInRow(0, -10, 10), [])
+        self.assertEqual(index.rows, {})
+        self.assertEqual(index.columns, {})
+
+    def testSamePosition(self):
+        index = PortIndex()
+        a, b = Port("a", (3, 3), 0), Port("b", (3, 3), 0)
+        index.add(1, [a])
+        index.add(2, [b])
+        index.remove(1)
+        self.assertEqual(index.portsInColumn(3, 3, 3), [b])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+
+from model import Resistor, Wire
+from router import ObstacleMap, RouteSearch, grid, route
+
+
+def segments(corners):
+    return list(zip(corners, corners[1:]))
+
+
+def cellsAlong(corners):
+    # every grid cell the route passes through
+    cells = set()
+    for (x0, y0), (x1, y1) in segments(corners):
+        for x in range(min(x0, x1), max(x0, x1) + 1, grid):
+            for y in range(min(y0, y1), max(y0, y1) + 1, grid):
+                cells.add((x, y))
+    return cells
+
+
+class RouterTest(unittest.TestCase):
+    def testStraight(self):
+        self.assertEqual(route(ObstacleMap(), (0, 0), (200, 0)), [(0, 0), (200, 0)])
+
+    def testAroundComponent(self):
+        obstacles = ObstacleMap()
+        # standing across the straight line, so the route has to go round
+        resistor = Resistor("R1", (100, 0), "north")
+        obstacles.addItem(resistor)
+        corners = route(obstacles, (0, 0), (200, 0))
+
+        self.assertEqual((corners[0], corners[-1]), ((0, 0), (200, 0)))
+        for (x0, y0), (x1, y1) in segments(corners):
+            self.assertTrue(x0 == x1 or y0 == y1)
+        left, top, right, bottom = resistor.hitRect()
+        for x, y in cellsAlong(corners):
+            self.assertFalse(left <= x <= right and top <= y <= bottom, (x, y))
+
+        obstacles.removeItem(resistor)
+        self.assertEqual(route(obstacles, (0, 0), (200, 0)), [(0, 0), (200, 0)])
+
+    def testCrossesWiresButNeverRunsAlong(self):
+        obstacles = ObstacleMap()
+        obstacles.addWire(Wire("wire1", (100, -100), (100, 100)))
+        self.assertEqual(route(obstacles, (0, 0), (200, 0)), [(0, 0), (200, 0)])
+
+        obstacles = ObstacleMap()
+        obstacles.addWire(Wire("wire1", (60, 0), (140, 0)))
+        corners = route(obstacles, (0, 0), (200, 0))
+        self.assertGreater(len(corners), 2)
+        self.assertFalse(cellsAlong(corners) & {(x, 0) for x in range(60, 141, grid)})
+
+    def testNoRoute(self):
+        obstacles = ObstacleMap()
+        obstacles.addItem(Resistor("R1", (100, 0), "north"))
+        # no room to go round
+        self.assertIsNone(route(obstacles, (0, 0), (200, 0), margin=0))
+
+    def testResumable(self):
+        obstacles = ObstacleMap()
+        obstacles.addItem(Resistor("R1", (4000, 0), "north"))
+        search = RouteSearch(obstacles, (0, 0), (8000, 0))
+        # a zero budget still makes some progress each call
+        self.assertFalse(search.run(0))
+        runs = 1
+        while not search.run(0):
+            runs += 1
+        self.assertGreater(runs, 1)
+        self.assertEqual(search.corners, route(obstacles, (0, 0), (8000, 0)))
+
+
+if __name__ == "__main__":
+    unittest.main()
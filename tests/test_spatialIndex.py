@@ -0,0 +1,57 @@
+import random
+import unittest
+
+from spatialIndex import SpatialIndex
+
+
+def randomRect():
+    left, top = random.randint(-300, 300), random.randint(-300, 300)
+    return (left, top, left + random.randint(0, 120), top + random.randint(0, 120))
+
+
+def contains(rect, x, y):
+    return rect[0] <= x <= rect[2] and rect[1] <= y <= rect[3]
+
+
+def overlaps(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+class SpatialIndexTest(unittest.TestCase):
+    def testMatchesBruteForce(self):
+        random.seed(1)
+        index = SpatialIndex()
+        # key -> rect, in insertion order like the index reports them
+        rects = {}
+        for step in range(600):
+            if rects and random.random() < 0.3:
+                key = random.choice(list(rects))
+                index.remove(key)
+                del rects[key]
+            else:
+                key = step
+                rects[key] = randomRect()
+                index.insert(key, rects[key])
+
+            x, y = random.randint(-320, 440), random.randint(-320, 440)
+            self.assertEqual(index.query((x, y)), [key for key, rect in rects.items() if contains(rect, x, y)])
+            area = randomRect()
+            self.assertEqual(index.queryRect(area), [key for key, rect in rects.items() if overlaps(rect, area)])
+        self.assertEqual(len(index), len(rects))
+
+    def testReinsertKeepsOrder(self):
+        index = SpatialIndex()
+        index.insert("a", (0, 0, 10, 10))
+        index.insert("b", (0, 0, 10, 10))
+        index.insert("a", (5, 5, 15, 15))
+        self.assertEqual(index.query((6, 6)), ["a", "b"])
+        self.assertEqual(index.query((1, 1)), ["b"])
+
+    def testRemoveUnknownKey(self):
+        index = SpatialIndex()
+        index.remove("nothing")
+        self.assertEqual(index.query((0, 0)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+
+import numpy as np
+
+from model import Capacitor, Resistor
+from values import parseValue, parseValues, valuesOf
+
+
+class ParseValueTest(unittest.TestCase):
+    def testPrefixes(self):
+        self.assertEqual(parseValue("5"), 5.0)
+        self.assertAlmostEqual(parseValue("1k"), 1e3)
+        self.assertAlmostEqual(parseValue("4.7u"), 4.7e-6)
+        self.assertAlmostEqual(parseValue("2M"), 2e6)
+        self.assertAlmostEqual(parseValue("100n"), 1e-7)
+        self.assertAlmostEqual(parseValue("1e-3"), 1e-3)
+        self.assertAlmostEqual(parseValue("-.5m"), -5e-4)
+
+    def testInfixPrefix(self):
+        self.assertAlmostEqual(parseValue("4k7"), 4700.0)
+        self.assertAlmostEqual(parseValue("2M2"), 2.2e6)
+        self.assertAlmostEqual(parseValue("1u5"), 1.5e-6)
+
+    def testUnits(self):
+        self.assertAlmostEqual(parseValue("10uF"), 1e-5)
+        self.assertAlmostEqual(parseValue("5 V"), 5.0)
+        self.assertAlmostEqual(parseValue("4k7Ω"), 4700.0)
+        self.assertAlmostEqual(parseValue("1k ohm"), 1e3)
+
+    def testErrors(self):
+        for text in ["", "k", "1x", "1kk", "4k7k", "1 2", "V"]:
+            with self.assertRaises(ValueError, msg=text):
+                parseValue(text)
+
+
+class BulkParseTest(unittest.TestCase):
+    def testParseValues(self):
+        np.testing.assert_allclose(parseValues(["1k", "4k7", "10"]), [1e3, 4.7e3, 10.0])
+        self.assertEqual(parseValues([]).shape, (0,))
+
+    def testValuesOf(self):
+        items = [Resistor("R1", (0, 0), 0, "1k"), Capacitor("C1", (0, 0), 0, "1u"), Resistor("R2", (0, 0), 0, "2k2")]
+        np.testing.assert_allclose(valuesOf(items, "R"), [1e3, 2.2e3])
+        np.testing.assert_allclose(valuesOf(items, "C"), [1e-6])
+
+        # the cached value follows edits
+        items[0].setPrimaryField("3k")
+        np.testing.assert_allclose(valuesOf(items, "R"), [3e3, 2.2e3])
+
+        items[2].setPrimaryField("lots")
+        with self.assertRaisesRegex(ValueError, "R2"):
+            valuesOf(items, "R")
+
+
+if __name__ == "__main__":
+    unittest.main()